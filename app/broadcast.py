@@ -0,0 +1,102 @@
+# app/broadcast.py
+
+import os
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Results go out at most once per window per poll, however fast votes come
+# in. The first vote of a window claims it with SET NX; whoever wins waits
+# out the window, then publishes one snapshot covering every vote since.
+BROADCAST_WINDOW_MS = int(os.getenv("BROADCAST_WINDOW_MS", "200"))
+# A claim outlives its window so a worker dying mid-window only delays the
+# next broadcast instead of blocking it forever
+CLAIM_GRACE_MS = 2000
+# vote_worker.py has no event loop to wait out windows in; it names the
+# polls it touched (comma-separated ids) on this channel and the API
+# workers schedule the broadcasts
+BROADCAST_NOTIFY = "broadcast:notify"
+
+
+def claim_key(poll_id: int) -> str:
+    return f"broadcast:pending:{poll_id}"
+
+
+def seq_key(poll_id: int) -> str:
+    return f"broadcast:seq:{poll_id}"
+
+
+def queue_seq_bump(pipe, poll_id: int):
+    """Queue the sequence increment; put it in the same MULTI as the snapshot read"""
+    pipe.incr(seq_key(poll_id))
+
+
+def broadcast_message(poll_id: int, seq: int, results: Dict[str, int]) -> str:
+    return json.dumps({"poll_id": poll_id, "seq": seq, "results": results})
+
+
+def queue_broadcast_notify(pipe, poll_ids: Iterable[int]):
+    pipe.publish(BROADCAST_NOTIFY, ",".join(str(poll_id) for poll_id in sorted(set(poll_ids))))
+
+
+class BroadcastScheduler:
+    """
+    Coalesces result broadcasts per poll across all workers. `snapshot(poll_id)`
+    returns (seq, results) read atomically, so a higher seq always carries
+    newer counts; subscribers drop any message whose seq is not above the
+    last one they saw.
+    """
+    def __init__(self, redis_client, snapshot: Callable[[int], Awaitable[Tuple[int, Dict[str, int]]]],
+                 window_ms: int = BROADCAST_WINDOW_MS):
+        self.redis = redis_client
+        self.snapshot = snapshot
+        self.window = window_ms / 1000
+        self.claim_ttl_ms = window_ms + CLAIM_GRACE_MS
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def schedule(self, poll_ids: Iterable[int], pipe=None) -> List:
+        """
+        Claim the next window of these polls and start a broadcast for every
+        claim won. With `pipe`, the claims ride along on it and it is executed
+        here; its own replies are returned.
+        """
+        poll_ids = sorted(set(poll_ids))
+        if pipe is None:
+            pipe = self.redis.pipeline(transaction=False)
+        for poll_id in poll_ids:
+            pipe.set(claim_key(poll_id), 1, nx=True, px=self.claim_ttl_ms)
+        replies = await pipe.execute()
+        split = len(replies) - len(poll_ids)
+        for poll_id, won in zip(poll_ids, replies[split:]):
+            if won:
+                task = asyncio.create_task(self._broadcast_later(poll_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return replies[:split]
+
+    def notified(self, data: str):
+        """Pub/sub handler for BROADCAST_NOTIFY"""
+        poll_ids = [int(p) for p in data.split(",") if p]
+        if poll_ids:
+            task = asyncio.create_task(self.schedule(poll_ids))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _broadcast_later(self, poll_id: int):
+        await asyncio.sleep(self.window)
+        try:
+            # Released before the snapshot: a vote landing after the read
+            # claims a new window rather than going unannounced
+            await self.redis.delete(claim_key(poll_id))
+            seq, results = await self.snapshot(poll_id)
+            await self.redis.publish(f"poll_{poll_id}", broadcast_message(poll_id, seq, results))
+        except Exception as e:
+            logger.error(f"Error broadcasting results for poll {poll_id}: {e}")
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,9 @@
+# app/gunicorn.conf.py
+# Picked up automatically by gunicorn from the working directory.
+
+from instrumentation import mark_process_dead
+
+
+def child_exit(server, worker):
+    # Live gauges (pool occupancy, WebSocket count) must forget dead workers
+    mark_process_dead(worker.pid)
@@ -0,0 +1,189 @@
+# app/instrumentation.py
+#
+# Prometheus metrics for the API. With PROMETHEUS_MULTIPROC_DIR set (see
+# docker-compose.yml) every gunicorn worker writes its samples to that
+# directory and /metrics/prometheus merges them, so a scrape sees the whole
+# container rather than whichever worker answered.
+
+import os
+import time
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess, REGISTRY
+)
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import redis.asyncio as redis_py
+
+MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Sub-millisecond Redis calls up to multi-second slow queries
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+HTTP_REQUESTS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+RATELIMIT_CHECK = Histogram(
+    "ratelimit_check_duration_seconds", "Time spent deciding whether to admit a request",
+    ["policy", "allowed"], buckets=LATENCY_BUCKETS
+)
+DB_STATEMENTS = Histogram(
+    "db_statement_duration_seconds", "Postgres statement latency by statement type",
+    ["operation"], buckets=LATENCY_BUCKETS
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool",
+    multiprocess_mode="livesum"
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity", "Pool size plus max overflow",
+    multiprocess_mode="livesum"
+)
+REDIS_COMMANDS = Histogram(
+    "redis_command_duration_seconds", "Redis round-trip latency by command (PIPELINE for batches)",
+    ["command"], buckets=LATENCY_BUCKETS
+)
+WS_FANOUT = Histogram(
+    "ws_fanout_duration_seconds", "Time to queue one update for every local subscriber",
+    buckets=LATENCY_BUCKETS
+)
+WS_MESSAGES = Counter(
+    "ws_messages_total", "WebSocket messages to clients: sent, failed, coalesced (replaced while queued), dropped",
+    ["result"]
+)
+WS_SLOW_CONSUMERS = Counter(
+    "ws_slow_consumer_disconnects_total", "WebSockets closed for falling behind, by reason", ["reason"]
+)
+WS_CONNECTIONS = Gauge(
+    "ws_connections", "Open WebSocket connections", multiprocess_mode="livesum"
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups by cache and outcome", ["cache", "result"]
+)
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_metrics() -> tuple:
+    """(body, content type) for the exposition endpoint"""
+    if MULTIPROC:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Drop a dead worker's live gauges; called from gunicorn's child_exit hook"""
+    if MULTIPROC:
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """Plain ASGI: times every HTTP request and labels it with its route template"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router leaves the matched route in the scope; raw paths
+            # would give every poll id its own series
+            route = scope.get("route")
+            HTTP_REQUESTS.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status)
+            ).observe(time.perf_counter() - start)
+
+
+class TimedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection"""
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine, capacity: int):
+    """Statement timing and pool occupancy for an async engine"""
+    sync_engine = engine.sync_engine
+    pool = sync_engine.pool
+    DB_POOL_CAPACITY.set(capacity)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_STATEMENTS.labels(operation).observe(time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute never runs for a failed statement
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            DB_STATEMENTS.labels("ERROR").observe(time.perf_counter() - starts.pop())
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_conn, record, proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_conn, record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+class TimedPipeline(redis_py.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMANDS.labels("PIPELINE").observe(time.perf_counter() - start)
+
+
+class TimedRedis(redis_py.Redis):
+    """redis.asyncio client that records the latency of every command"""
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMANDS.labels(str(args[0]).split(" ", 1)[0].upper()).observe(
+                time.perf_counter() - start
+            )
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None):
+        return TimedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
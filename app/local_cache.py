@@ -0,0 +1,68 @@
+# app/local_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL.
+    Lives in each worker in front of Redis for data that rarely changes;
+    entries are dropped early through invalidate() when a change is announced.
+    """
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -1,32 +1,74 @@
 # app/main.py
 
+import os
 import json
-import asyncio
+import math
 import time
 import hashlib
 import logging
-from fastapi import FastAPI, WebSocket, Depends, HTTPException, status, WebSocketDisconnect, Request
-from sqlmodel import SQLModel, Session, select, create_engine
-from sqlalchemy import func, insert
+from fastapi import FastAPI, WebSocket, Depends, HTTPException, status, WebSocketDisconnect, Request, Response, Query
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import selectinload
-from sqlalchemy.pool import QueuePool
-import redis as redis_py
+import redis.asyncio as redis_py
 from typing import Optional, List, Dict, Set
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse, StreamingResponse
 from enum import Enum
 
-from models import Poll, Option, Vote, PollOptionLink
+from models import Poll, Theme
+from stats_store import (
+    STATS_LOADED, queue_poll_stats, queue_stats_load, queue_stats_read,
+    stats_from_replies, stats_snapshot_queries
+)
+from timeline_store import (
+    RESOLUTIONS, TIMELINE_LOADED, epoch_of, queue_timeline_read, timeline_from_replies
+)
+from themes import THEMES_KEY, THEMES_TTL, themes_payload
+from poll_store import (
+    POLL_INVALIDATE_CHANNEL, invalidated_polls, link_insert, link_rows, option_insert,
+    option_rows, poll_insert, poll_rows, queue_poll_invalidation, theme_bumps
+)
+from partitions import ensure_vote_partitions
+from realtime import Listener, PubSubHub, Subscriber
+from ws_protocol import DELTA, negotiate
+from broadcast import BROADCAST_NOTIFY, BroadcastScheduler, broadcast_message, queue_seq_bump, seq_key
+from local_cache import LocalCache
+from swr_cache import SingleFlight, SWRCache
+from instrumentation import (
+    MetricsMiddleware, TimedPool, TimedRedis, RATELIMIT_CHECK, cache_lookup,
+    instrument_engine, render_metrics
+)
+from ratelimit import (
+    RateLimiter, RatePolicy, RedisGCRABackend, LocalGCRABackend, LocalPrefilter
+)
+from vote_store import (
+    VOTE_STREAM, RESULTS_LOADED, VERSION_EPOCH, POLLS_VERSION, RESULTS_VERSION,
+    encode_vote, vote_insert, count_upsert, results_key, version_key,
+    counts_query, group_counts, queue_result_increments, queue_results_load,
+    queue_version_bumps, results_from_hash
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-DATABASE_URL = "postgresql://postgres:pass@db:5432/votes"
-REDIS_URL    = "redis://redis:6379/0"
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:pass@db:5432/votes")
+# The API talks to Postgres through asyncpg; maintenance scripts keep psycopg2
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+)
+REDIS_URL    = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+# "sync" writes each vote to Postgres in the request; "stream" appends it to
+# a Redis Stream drained in batches by vote_worker.py
+VOTE_INGEST_MODE = os.getenv("VOTE_INGEST_MODE", "sync")
 
 # Circuit breaker implementation for enhanced resilience
 class CircuitState(Enum):
@@ -85,94 +127,186 @@ class CircuitBreaker:
 db_circuit_breaker = CircuitBreaker(failure_threshold=5, timeout=60)
 redis_circuit_breaker = CircuitBreaker(failure_threshold=3, timeout=30)
 
-# Rate limiting middleware
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, calls: int = 10, period: int = 60):
-        super().__init__(app)
-        self.calls = calls
-        self.period = period
+# Rate limiting middleware (plain ASGI: no extra task or body streaming per request)
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
-    async def dispatch(self, request: Request, call_next):
         # Skip rate limiting for static files and health checks
-        if (request.url.path.startswith("/css/") or 
-            request.url.path.startswith("/js/") or 
-            request.url.path.endswith(".html") or
-            request.url.path in ["/health", "/favicon.ico"]):
-            return await call_next(request)
+        path = scope["path"]
+        if (path.startswith("/css/") or 
+            path.startswith("/js/") or 
+            path.endswith(".html") or
+            path in ["/health", "/favicon.ico", "/metrics/prometheus"]):
+            return await self.app(scope, receive, send)
             
         # Get client IP
-        client_ip = request.client.host
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
         
-        # Create unique client key
-        key = f"rate_limit:{client_ip}"
-        
-        # Check rate limit
-        current_time = time.time()
+        start = time.perf_counter()
         try:
-            # Use Redis for rate limiting
-            pipe = redis_client.pipeline()
-            pipe.zremrangebyscore(key, 0, current_time - self.period)
-            pipe.zcount(key, current_time - self.period, current_time)
-            pipe.zadd(key, {str(current_time): current_time})
-            pipe.expire(key, self.period)
-            results = pipe.execute()
-            
-            current_calls = results[1]
-            
-            if current_calls >= self.calls:
-                return JSONResponse(
-                    status_code=429,
-                    content={"detail": "Rate limit exceeded"}
-                )
+            policy, decision = await self.limiter.check(client_ip, scope["method"], path)
+            RATELIMIT_CHECK.labels(policy.name, str(decision.allowed).lower()).observe(
+                time.perf_counter() - start
+            )
         except Exception as e:
             logger.warning(f"Rate limiting error: {e}")
             # If rate limiting fails, allow the request
-            pass
-        
-        response = await call_next(request)
-        return response
+            return await self.app(scope, receive, send)
+
+        if not decision.allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={
+                    "Retry-After": str(max(1, math.ceil(decision.retry_after))),
+                    "X-RateLimit-Limit": str(policy.limit),
+                    "X-RateLimit-Remaining": "0"
+                }
+            )
+            return await response(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(policy.limit)
+                headers["X-RateLimit-Remaining"] = str(decision.remaining)
+            await send(message)
 
-# Optimize database connections
-engine = create_engine(
-    DATABASE_URL, 
+        await self.app(scope, receive, send_with_headers)
+
+# Optimize database connections (asyncpg, pooled per worker)
+DB_POOL_SIZE = 20
+DB_MAX_OVERFLOW = 30
+engine = create_async_engine(
+    ASYNC_DATABASE_URL, 
     echo=False,  # Disable SQL logs in production
-    pool_size=20,  # Increase pool size
-    max_overflow=30,
+    pool_size=DB_POOL_SIZE,  # Increase pool size
+    max_overflow=DB_MAX_OVERFLOW,
     pool_pre_ping=True,
     pool_recycle=3600,
-    poolclass=QueuePool
+    poolclass=TimedPool  # records checkout wait time
 )
+instrument_engine(engine, capacity=DB_POOL_SIZE + DB_MAX_OVERFLOW)
 
-# Configure Redis with connection pooling
-redis_client = redis_py.from_url(
-    REDIS_URL, 
-    decode_responses=True,
-    max_connections=20,
-    retry_on_timeout=True,
-    socket_timeout=5
+# Configure Redis with connection pooling. The blocking pool makes callers
+# wait for a free connection instead of failing once all of them are busy.
+redis_client = TimedRedis(
+    connection_pool=redis_py.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        max_connections=50,
+        timeout=5,
+        retry_on_timeout=True,
+        socket_timeout=5
+    )
 )
 
-# Create tables
-SQLModel.metadata.create_all(engine)
+# One pub/sub listener per worker, fanning out to local WebSockets
+hub = PubSubHub(REDIS_URL)
+
+# Parsed poll definitions kept in each worker in front of Redis. Storing
+# polls (creation or a reseed) announces them on POLL_INVALIDATE_CHANNEL so
+# every worker drops its copies.
+poll_cache = LocalCache(maxsize=10000, ttl=300)
+
+
+def drop_cached_polls(data: str):
+    poll_ids = invalidated_polls(data)
+    if poll_ids is None:
+        poll_cache.clear()
+        return
+    for poll_id in poll_ids:
+        poll_cache.invalidate(poll_id)
+
+
+hub.on_channel(POLL_INVALIDATE_CHANNEL, drop_cached_polls)
+
+# Only one recompute per key at a time, per worker and across workers
+flight = SingleFlight(redis_client)
+swr = SWRCache(redis_client, flight)
+
+
+async def results_snapshot(poll_id: int):
+    """(seq, results) for a broadcast; the seq is bumped in the same MULTI as the read"""
+    pipe = redis_client.pipeline()
+    pipe.hgetall(results_key(poll_id))
+    queue_seq_bump(pipe, poll_id)
+    raw, seq = await pipe.execute()
+    async with AsyncSession(engine) as session:
+        poll = await get_poll(poll_id, session) if raw.get(RESULTS_LOADED) else None
+        if poll is not None:
+            return seq, results_from_hash(raw, poll.options)
+        return seq, await current_results(poll_id, session)
+
+
+async def current_snapshots(poll_ids: List[int], session: AsyncSession) -> Dict[int, tuple]:
+    """
+    poll_id -> (seq, results) as of the last broadcast, for new subscribers;
+    one MULTI reads every hash with its seq, the definitions come in one batch
+    and cold hashes are loaded with one grouped query
+    """
+    pipe = redis_client.pipeline()
+    for poll_id in poll_ids:
+        pipe.hgetall(results_key(poll_id))
+        pipe.get(seq_key(poll_id))
+    replies = await pipe.execute()
+    hashes = dict(zip(poll_ids, replies[0::2]))
+    seqs = {poll_id: int(seq or 0) for poll_id, seq in zip(poll_ids, replies[1::2])}
+
+    polls = await get_polls(poll_ids, session)
+    cold = []
+    for poll_id in poll_ids:
+        hit = bool(hashes[poll_id].get(RESULTS_LOADED)) and poll_id in polls
+        cache_lookup("results", hit)
+        if not hit:
+            cold.append(poll_id)
+    loaded = await load_results(session, cold) if cold else {}
+
+    return {
+        poll_id: (seqs[poll_id], loaded[poll_id] if poll_id in loaded
+                  else results_from_hash(hashes[poll_id], polls[poll_id].options))
+        for poll_id in poll_ids
+    }
+
+
+# Coalesced result broadcasts, at most one per poll per window
+broadcasts = BroadcastScheduler(redis_client, results_snapshot)
+hub.on_channel(BROADCAST_NOTIFY, broadcasts.notified)
 
 # Active WebSocket connections
-active_connections: Dict[str, Set[WebSocket]] = {}
+active_connections: Dict[str, Set[Subscriber]] = hub.connections
 
 # Lifespan to clean connections
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        # Today's partition at least; partitions.py keeps the rest coming
+        await conn.run_sync(ensure_vote_partitions)
+    await hub.start()
     logger.info("Application started")
     yield
     # Shutdown
+    await broadcasts.stop()
+    await hub.stop()
     logger.info("Closing WebSocket connections...")
     for poll_id, connections in active_connections.items():
-        for ws in connections.copy():
+        for sub in connections.copy():
+            sub.stop()
             try:
-                await ws.close()
+                await sub.ws.close()
             except:
                 pass
         connections.clear()
+    await redis_client.close()
+    await engine.dispose()
     logger.info("Application closed")
 
 app = FastAPI(title="Vote Stream", lifespan=lifespan)
@@ -186,28 +320,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add rate limiting - more generous for normal usage, still protects against abuse
-app.add_middleware(RateLimitMiddleware, calls=200, period=60)
+# Add rate limiting - more generous for normal usage, still protects against abuse.
+# Policies are checked in order; votes and poll creation get their own budgets.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")
+rate_limiter = RateLimiter(
+    backend=(RedisGCRABackend(redis_client) if RATE_LIMIT_BACKEND == "redis"
+             else LocalGCRABackend()),
+    policies=[
+        RatePolicy("vote", limit=200, period=60, burst=150, methods=["POST"], path=r"^/polls/\d+/vote$"),
+        RatePolicy("vote-batch", limit=20, period=60, burst=5, methods=["POST"], path=r"^/votes:batch$"),
+        RatePolicy("write", limit=30, period=60, burst=10, methods=["POST", "PUT", "DELETE"]),
+        RatePolicy("read", limit=300, period=60, burst=60, methods=["GET", "HEAD"]),
+    ],
+    default=RatePolicy("default", limit=200, period=60),
+    prefilter=LocalPrefilter()
+)
+# "off" is for load tests (see bench/), where every request comes from one IP
+if RATE_LIMIT_BACKEND != "off":
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 
+# Outermost, so request latency includes rate limiting and CORS
+app.add_middleware(MetricsMiddleware)
 
-def get_session():
-    with Session(engine) as session:
+
+async def get_session():
+    # Objects stay readable after commit without another round-trip
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
 
 @app.get("/health")
-def health():
+async def health():
     try:
         # Check Redis
-        redis_client.ping()
+        await redis_client.ping()
         redis_ok = True
     except:
         redis_ok = False
     
     try:
         # Check DB
-        with Session(engine) as session:
-            session.exec(select(func.count(Poll.id)))
+        async with AsyncSession(engine) as session:
+            await session.exec(select(func.count(Poll.id)))
         db_ok = True
     except:
         db_ok = False
@@ -241,132 +395,535 @@ class PollWithResults(SQLModel):
     results: Dict[str, int]
 
 
-# 1) Cached aggregated results
-@app.get("/polls/{poll_id}/results")
-def results(poll_id: int, session: Session = Depends(get_session)):
-    key = f"results:{poll_id}"
-    cached = redis_client.get(key)
-    if cached:
-        return json.loads(cached)
+async def get_poll(poll_id: int, session: AsyncSession) -> Optional[PollRead]:
+    """Poll definition from the worker cache, then Redis, then Postgres"""
+    return (await get_polls([poll_id], session)).get(poll_id)
+
+
+async def get_polls(poll_ids: List[int], session: AsyncSession) -> Dict[int, PollRead]:
+    """
+    poll_id -> definition for the ids that exist; whatever the worker cache
+    lacks costs one MGET, and whatever Redis lacks one IN query
+    """
+    polls: Dict[int, PollRead] = {}
+    for poll_id in poll_ids:
+        pr = poll_cache.get(poll_id)
+        cache_lookup("poll_local", pr is not None)
+        if pr is not None:
+            polls[poll_id] = pr
+    pending = [p for p in poll_ids if p not in polls]
+    if not pending:
+        return polls
+
+    misses = []
+    for poll_id, raw in zip(pending, await redis_client.mget([f"poll:{p}" for p in pending])):
+        cache_lookup("poll", bool(raw))
+        pr = None
+        if raw:
+            try:
+                pr = PollRead.parse_raw(raw)
+            except ValueError:
+                # Corrupted entry, rebuild it from the database below
+                pass
+        if pr is None:
+            misses.append(poll_id)
+        else:
+            polls[poll_id] = pr
+            poll_cache.set(poll_id, pr)
+
+    if misses:
+        rows = (await session.exec(
+            select(Poll).options(selectinload(Poll.options)).where(Poll.id.in_(misses))
+        )).all()
+        pipe = redis_client.pipeline(transaction=False)
+        for poll in rows:
+            pr = PollRead.from_orm(poll)
+            pipe.set(f"poll:{pr.id}", pr.json(), ex=60)
+            polls[pr.id] = pr
+            poll_cache.set(pr.id, pr)
+        await pipe.execute()
+    return polls
+
+
+async def current_etag(request: Request, *version_keys: str) -> Optional[str]:
+    """
+    Strong ETag for the current version counters of a response; the query
+    string is folded in so every filtered or paginated view has its own tag.
+    None until the epoch exists, in which case the response goes out untagged.
+    """
+    epoch, *versions = await redis_client.mget(VERSION_EPOCH, *version_keys)
+    if epoch is None:
+        await redis_client.set(VERSION_EPOCH, time.time_ns(), nx=True)
+        return None
+    tag = ".".join([epoch] + [v or "0" for v in versions])
+    if request.url.query:
+        tag += "." + hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    return f'"{tag}"'
+
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """304 response if the client already holds this version, else None"""
+    if etag is None:
+        return None
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if "*" in candidates or etag in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+
+def tag_response(response: Response, etag: Optional[str]):
+    if etag is not None:
+        response.headers["ETag"] = etag
+        # Cacheable, but always revalidated against the version counters
+        response.headers["Cache-Control"] = "no-cache"
+
+
+async def load_results(session: AsyncSession, poll_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """Cold-start loader: fill the results hashes of these polls from Postgres"""
+    grouped = group_counts((await session.exec(counts_query(poll_ids))).all())
+    pipe = redis_client.pipeline()
+    for poll_id, options in grouped.items():
+        queue_results_load(pipe, poll_id, options)
+    await pipe.execute()
+    return {
+        poll_id: {text: count for _, text, count in grouped.get(poll_id, [])}
+        for poll_id in poll_ids
+    }
+
+
+async def cached_results(poll_id: int, session: AsyncSession) -> Optional[Dict[str, int]]:
+    """Results from the live hash, or None while it isn't loaded"""
+    try:
+        raw = await redis_client.hgetall(results_key(poll_id))
+    except redis_py.ResponseError:
+        # Legacy JSON string under the same key; the loader replaces it
+        return None
+    cache_lookup("results", bool(raw.get(RESULTS_LOADED)))
+    if not raw.get(RESULTS_LOADED):
+        return None
+    poll = await get_poll(poll_id, session)
+    if not poll:
+        return None
+    return results_from_hash(raw, poll.options)
+
+
+async def current_results(poll_id: int, session: AsyncSession) -> Dict[str, int]:
+    res = await cached_results(poll_id, session)
+    if res is not None:
+        return res
     
-    # Optimized query with index hints
-    stmt = (
-        select(Option.text, func.count(Vote.id).label('vote_count'))
-        .join(Vote, Vote.option_id == Option.id, isouter=True)
-        .join(PollOptionLink, PollOptionLink.option_id == Option.id)
-        .where(PollOptionLink.poll_id == poll_id)
-        .group_by(Option.id, Option.text)
+    # Cold hash: one loader per poll, everyone else waits for its result
+    async def load():
+        return (await load_results(session, [poll_id]))[poll_id]
+
+    return await flight.do(
+        results_key(poll_id),
+        load,
+        peek=lambda: cached_results(poll_id, session)
     )
-    rows = session.exec(stmt).all()
-    res = {text: count for text, count in rows}
-    
-    # Cache for longer time if no votes yet
-    cache_time = 300 if any(count > 0 for count in res.values()) else 60
-    redis_client.set(key, json.dumps(res), ex=cache_time)
+
+
+# Longest a long-poll request is held open waiting for new results
+LONG_POLL_TIMEOUT = 25
+# Comment line sent on an idle event stream, so proxies don't time it out
+SSE_KEEPALIVE = 15
+
+
+async def results_since(poll_id: int, since: int, timeout: float, session: AsyncSession) -> Response:
+    """
+    Long-poll: the results as a broadcast message as soon as their seq is past
+    `since`, or 204 once `timeout` seconds go by without one
+    """
+    poll_key = str(poll_id)
+    listener = Listener(since)
+    # Listening before the read, so a broadcast in between isn't missed
+    hub.listen(poll_key, listener)
+    try:
+        if not await get_poll(poll_id, session):
+            raise HTTPException(status_code=404, detail="Poll not found")
+        seq, res = (await current_snapshots([poll_id], session))[poll_id]
+        # Nothing else to read; don't hold a pooled connection while parked
+        await session.close()
+        if seq > since:
+            data = broadcast_message(poll_id, seq, res)
+        else:
+            taken = await listener.next(timeout)
+            if taken is None:
+                return Response(status_code=204, headers={"Cache-Control": "no-store"})
+            data = taken[1]
+    finally:
+        hub.unlisten(poll_key, listener)
+    return Response(content=data, media_type="application/json", headers={"Cache-Control": "no-store"})
+
+
+# 1) Live results from the per-poll Redis hash counters
+@app.get("/polls/{poll_id}/results")
+async def results(
+    poll_id: int,
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0),
+    timeout: float = Query(LONG_POLL_TIMEOUT, gt=0, le=LONG_POLL_TIMEOUT),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Plain: the results keyed by option text. With ?since=<seq>: long-poll,
+    see results_since()
+    """
+    if since is not None:
+        return await results_since(poll_id, since, timeout, session)
+    # The version is read before the payload, so the tag is never newer than it
+    etag = await current_etag(request, version_key(poll_id))
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    res = await current_results(poll_id, session)
+    tag_response(response, etag)
     return res
 
 
+def sse_event(seq: int, data: str) -> str:
+    return f"id: {seq}\nevent: results\ndata: {data}\n\n"
+
+
+async def result_events_stream(poll_id: int, since: Optional[int]):
+    poll_key = str(poll_id)
+    listener = Listener(-1 if since is None else since)
+    hub.listen(poll_key, listener)
+    try:
+        async with AsyncSession(engine) as session:
+            seq, res = (await current_snapshots([poll_id], session))[poll_id]
+        if since is None or seq > since:
+            listener.skip_to(seq)
+            yield sse_event(seq, broadcast_message(poll_id, seq, res))
+        while True:
+            taken = await listener.next(SSE_KEEPALIVE)
+            yield ": keepalive\n\n" if taken is None else sse_event(*taken)
+    finally:
+        hub.unlisten(poll_key, listener)
+
+
+# 1.1) Live results as Server-Sent Events, for clients without WebSockets
+@app.get("/polls/{poll_id}/events")
+async def result_events(
+    poll_id: int,
+    request: Request,
+    since: Optional[int] = Query(None, ge=0)
+):
+    """
+    One "results" event per broadcast, with the seq as event id and the same
+    data as a JSON WebSocket message. It starts with the current results
+    unless Last-Event-ID (sent by reconnecting browsers) or ?since= shows the
+    client already has them.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    # Checked with a short-lived session: a dependency's would stay open as
+    # long as the stream
+    async with AsyncSession(engine) as session:
+        if not await get_poll(poll_id, session):
+            raise HTTPException(status_code=404, detail="Poll not found")
+    return StreamingResponse(
+        result_events_stream(poll_id, since),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx passes events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# A timeline without from/to ends now and spans this far back
+TIMELINE_DEFAULT_SPAN = {"1m": 3600, "1h": 86400, "1d": 30 * 86400}
+MAX_TIMELINE_POINTS = 2000
+
+
+def parse_instant(value: str) -> int:
+    """Epoch seconds from epoch seconds or an ISO 8601 timestamp (UTC when naive)"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        # inf can't become an int and nan isn't an instant
+        if not math.isfinite(seconds):
+            raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+        return int(seconds)
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return epoch_of(ts)
+
+
+# Seconds a client is asked to wait while the timelines are being reloaded
+TIMELINE_RETRY_AFTER = 30
+
+
+async def read_timeline(poll_id: int, res, first: int, last: int) -> List[Dict[str, str]]:
+    """
+    The chunk hashes covering buckets first..last. If Redis lost the
+    timelines, rebuilding them scans the vote table, which is left to
+    reconcile_counts.py; until then the answer is 503.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(TIMELINE_LOADED)
+    queue_timeline_read(pipe, poll_id, res, first, last)
+    loaded, *replies = await pipe.execute()
+    cache_lookup("timeline", bool(loaded))
+    if not loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Timelines are being reloaded, try again later",
+            headers={"Retry-After": str(TIMELINE_RETRY_AFTER)}
+        )
+    return replies
+
+
+# 1.1) Votes over time, from per-bucket Redis counters
+@app.get("/polls/{poll_id}/timeline")
+async def timeline(
+    poll_id: int,
+    bucket: str = "1m",
+    since: Optional[str] = Query(None, alias="from"),
+    until: Optional[str] = Query(None, alias="to"),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Votes per option per bucket over [from, to), as column arrays: `t` holds
+    the bucket start times (epoch seconds) and `counts[i]` the votes for
+    `options[i]` in each of them. Empty buckets are zeros, never left out.
+    """
+    res = RESOLUTIONS.get(bucket)
+    if res is None:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(RESOLUTIONS)}")
+    now = int(time.time())
+    end = parse_instant(until) if until else now
+    start = parse_instant(since) if since else end - TIMELINE_DEFAULT_SPAN[bucket]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    first, last = start // res.step, (end - 1) // res.step
+    if last - first + 1 > MAX_TIMELINE_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_TIMELINE_POINTS} buckets per request; narrow the range or use a coarser bucket"
+        )
+    oldest = res.oldest_bucket(now)
+    if oldest is not None and first < oldest:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{bucket} buckets only go back {res.retention // 86400} days; use a coarser bucket"
+        )
+
+    poll = await get_poll(poll_id, session)
+    if not poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+    replies = await read_timeline(poll_id, res, first, last)
+    return {
+        "poll_id": poll_id,
+        "bucket": bucket,
+        "step": res.step,
+        "from": first * res.step,
+        "to": (last + 1) * res.step,
+        "t": [b * res.step for b in range(first, last + 1)],
+        "options": [opt.text for opt in poll.options],
+        "counts": timeline_from_replies(replies, [opt.id for opt in poll.options], first, last),
+    }
+
+
 # 2) Cached single poll read
 @app.get("/polls/{poll_id}", response_model=PollRead)
-def read_poll(poll_id: int, session: Session = Depends(get_session)):
-    key = f"poll:{poll_id}"
-    raw = redis_client.get(key)
-    if raw:
-        return PollRead.parse_raw(raw)
-    poll = session.exec(
-        select(Poll).options(selectinload(Poll.options))
-        .where(Poll.id == poll_id)
-    ).one_or_none()
-    if not poll:
+async def read_poll(
+    poll_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_session)
+):
+    etag = await current_etag(request, version_key(poll_id))
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    pr = await get_poll(poll_id, session)
+    if not pr:
         raise HTTPException(status_code=404, detail="Poll not found")
-    pr = PollRead.from_orm(poll)
-    redis_client.set(key, pr.json(), ex=60)
+    tag_response(response, etag)
     return pr
 
 
 # 3) Combined endpoint: polls + their current results
 @app.get("/polls-with-results", response_model=List[PollWithResults])
-def list_polls_with_results(session: Session = Depends(get_session)):
-    polls = session.exec(
-        select(Poll).options(selectinload(Poll.options))
-    ).all()
-    out: List[PollWithResults] = []
+async def list_polls_with_results(
+    request: Request,
+    response: Response,
+    theme: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    session: AsyncSession = Depends(get_session)
+):
+    etag = await current_etag(request, POLLS_VERSION, RESULTS_VERSION)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    tag_response(response, etag)
+
+    query = select(Poll).options(selectinload(Poll.options))
+    if theme is not None:
+        query = query.where(Poll.theme == theme)
+    polls = (await session.exec(query.offset(skip).limit(limit))).all()
+    if not polls:
+        return []
+    
+    # One round-trip for every results hash on the page
+    pipe = redis_client.pipeline(transaction=False)
     for p in polls:
-        pr = PollRead.from_orm(p)
-        rr = results(p.id, session)  # uses cache
-        out.append(PollWithResults(
-            id=pr.id,
-            question=pr.question,
-            options=pr.options,
-            results=rr
-        ))
-    return out
+        pipe.hgetall(results_key(p.id))
+    hashes = await pipe.execute(raise_on_error=False)
+    
+    out: List[PollWithResults] = []
+    missing: List[int] = []
+    for p, raw in zip(polls, hashes):
+        hit = isinstance(raw, dict) and bool(raw.get(RESULTS_LOADED))
+        cache_lookup("results", hit)
+        if hit:
+            out.append(results_from_hash(raw, p.options))
+        else:
+            out.append(None)
+            missing.append(p.id)
+    
+    # One grouped query and one pipeline for all the cold polls
+    loaded = await load_results(session, missing) if missing else {}
+    
+    return [
+        PollWithResults(
+            id=p.id,
+            question=p.question,
+            theme=p.theme,
+            options=PollRead.from_orm(p).options,
+            results=rr if rr is not None else loaded[p.id]
+        )
+        for p, rr in zip(polls, out)
+    ]
+
+
+# Polls are paged by keyset on id (ids follow creation order): the next page
+# starts after the last id the client saw, so deep pages cost the same as
+# the first one. NDJSON streams the whole selection from a server-side cursor.
+NDJSON = "application/x-ndjson"
+STREAM_BATCH = 500
+MAX_PAGE = 1000
+
+
+def wants_ndjson(request: Request) -> bool:
+    return (NDJSON in request.headers.get("accept", "")
+            or request.query_params.get("format") == "ndjson")
+
+
+def keyset_page(query, after: Optional[int], limit: Optional[int]):
+    query = query.order_by(Poll.id)
+    if after is not None:
+        query = query.where(Poll.id > after)
+    return query.limit(limit) if limit else query
+
+
+async def stream_polls(query):
+    """One PollRead per line, fetched STREAM_BATCH rows at a time"""
+    async with AsyncSession(engine) as session:
+        polls = await session.stream_scalars(query.execution_options(yield_per=STREAM_BATCH))
+        async for poll in polls:
+            yield PollRead.from_orm(poll).json().encode() + b"\n"
+            # Nothing else needs the row; keep the identity map small
+            session.expunge(poll)
+
+
+async def polls_listing(
+    request: Request,
+    response: Response,
+    query,
+    after: Optional[int],
+    limit: Optional[int],
+    session: AsyncSession
+):
+    etag = await current_etag(request, POLLS_VERSION)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    if wants_ndjson(request):
+        # Full export unless a limit was asked for
+        headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+        return StreamingResponse(
+            stream_polls(keyset_page(query, after, limit)),
+            media_type=NDJSON,
+            headers=headers
+        )
+
+    limit = min(limit or 100, MAX_PAGE)
+    polls = (await session.exec(keyset_page(query, after, limit))).all()
+    tag_response(response, etag)
+    if len(polls) == limit:
+        response.headers["X-Next-Cursor"] = str(polls[-1].id)
+    return [PollRead.from_orm(p) for p in polls]
 
 
 # 4) List polls (with options)
 @app.get("/polls", response_model=List[PollRead])
-def list_polls(
+async def list_polls(
+    request: Request,
+    response: Response,
     active: Optional[bool] = None,
     theme: Optional[str] = None,
+    after: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100,
-    session: Session = Depends(get_session)
+    limit: Optional[int] = None,
+    session: AsyncSession = Depends(get_session)
 ):
     query = select(Poll).options(selectinload(Poll.options))
     if active is not None:
         query = query.where(Poll.is_active == active)
     if theme is not None:
         query = query.where(Poll.theme == theme)
-    polls = session.exec(query.offset(skip).limit(limit)).all()
-    return [PollRead.from_orm(p) for p in polls]
+    # Offset paging is still accepted for old clients; prefer ?after=
+    if skip and after is None:
+        query = query.offset(skip)
+    return await polls_listing(request, response, query, after, limit, session)
 
 
 # 4.1) Get polls by theme
 @app.get("/themes/{theme}/polls", response_model=List[PollRead])
-def get_polls_by_theme(
+async def get_polls_by_theme(
     theme: str,
-    session: Session = Depends(get_session)
+    request: Request,
+    response: Response,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    session: AsyncSession = Depends(get_session)
 ):
     query = select(Poll).options(selectinload(Poll.options)).where(Poll.theme == theme)
-    polls = session.exec(query).all()
-    return [PollRead.from_orm(p) for p in polls]
+    return await polls_listing(request, response, query, after, limit, session)
+
+
+# 4.2) Get available themes (one Redis read; rebuilt from the theme table on a miss)
+async def load_themes() -> str:
+    async with AsyncSession(engine) as session:
+        themes = (await session.exec(select(Theme).order_by(Theme.position, Theme.key))).all()
+    payload = json.dumps(themes_payload(themes), ensure_ascii=False)
+    await redis_client.set(THEMES_KEY, payload, ex=THEMES_TTL)
+    return payload
 
 
-# 4.2) Get available themes
 @app.get("/themes")
-def get_themes(session: Session = Depends(get_session)):
-    themes_info = {
-        "OnTrend": {
-            "name": "#OnTrend",
-            "slug": "on-trend",
-            "description": "The hottest topics of the moment. From technology and social media to the releases everyone is talking about. Vote and discover if you think like the majority!",
-            "color": "#ff6b6b",
-            "icon": "🔥"
-        },
-        "MoralDilemmas": {
-            "name": "Moral Dilemmas",
-            "slug": "moral-dilemmas",
-            "description": "Difficult questions with no right answer. Test your principles and discover how the world would react to these extreme situations.",
-            "color": "#4ecdc4",
-            "icon": "🤔"
-        },
-        "Sports": {
-            "name": "⚽ Sports",
-            "slug": "sports",
-            "description": "The boldest predictions in the world of sports. Will you get your predictions right?",
-            "color": "#45b7d1",
-            "icon": "⚽"
-        }
-    }
-    
-    # Add poll count by theme
-    for theme_key in themes_info.keys():
-        count = session.exec(
-            select(func.count(Poll.id)).where(Poll.theme == theme_key)
-        ).one()
-        themes_info[theme_key]["poll_count"] = count
-    
-    return themes_info
+async def get_themes():
+    payload = await redis_client.get(THEMES_KEY)
+    cache_lookup("themes", payload is not None)
+    if payload is None:
+        payload = await flight.do(THEMES_KEY, load_themes, peek=lambda: redis_client.get(THEMES_KEY))
+    # Stored serialized, so it goes out as is
+    return Response(content=payload, media_type="application/json")
 
 
 # 5) Vote and publish via Redis (invalidate cache) - OPTIMIZED
@@ -374,7 +931,7 @@ def get_themes(session: Session = Depends(get_session)):
 async def vote(
     poll_id: int,
     payload: dict,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     choice_idx = payload.get("choice")
     
@@ -382,85 +939,241 @@ async def vote(
     if not isinstance(choice_idx, int) or choice_idx < 0:
         raise HTTPException(status_code=400, detail="Invalid choice")
     
-    # Cache key for the poll
-    poll_key = f"poll:{poll_id}"
-    
-    # Try to get poll from cache first
-    cached_poll = redis_client.get(poll_key)
-    if cached_poll:
-        try:
-            poll_data = json.loads(cached_poll)
-            if choice_idx >= len(poll_data.get("options", [])):
-                raise HTTPException(status_code=400, detail="Invalid choice")
-            option_id = poll_data["options"][choice_idx]["id"]
-        except (json.JSONDecodeError, KeyError):
-            # Fallback to DB if cache is corrupted
-            poll = session.exec(
-                select(Poll).options(selectinload(Poll.options))
-                .where(Poll.id == poll_id)
-            ).one_or_none()
-            if not poll or choice_idx >= len(poll.options):
-                raise HTTPException(status_code=400, detail="Invalid poll or choice")
-            option_id = poll.options[choice_idx].id
-    else:
-        # Get from DB
-        poll = session.exec(
-            select(Poll).options(selectinload(Poll.options))
-            .where(Poll.id == poll_id)
-        ).one_or_none()
-        if not poll or choice_idx >= len(poll.options):
-            raise HTTPException(status_code=400, detail="Invalid poll or choice")
-        option_id = poll.options[choice_idx].id
+    # Validate against the cached poll definition (usually no round-trip)
+    poll = await get_poll(poll_id, session)
+    if not poll or choice_idx >= len(poll.options):
+        raise HTTPException(status_code=400, detail="Invalid poll or choice")
+    option_id = poll.options[choice_idx].id
 
-    # Insert vote in optimized way
-    vote_obj = Vote(poll_id=poll_id, option_id=option_id)
-    session.add(vote_obj)
-    session.commit()
+    # Stream mode: accept now, vote_worker.py persists and publishes
+    if VOTE_INGEST_MODE == "stream":
+        await redis_client.xadd(VOTE_STREAM, encode_vote(poll_id, option_id))
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "accepted"}
+        )
 
-    # Invalidate results cache
-    redis_client.delete(f"results:{poll_id}")
+    # Insert the vote and bump its option counter in one transaction
+    row = {"poll_id": poll_id, "option_id": option_id, "voted_at": datetime.utcnow()}
+    await session.execute(vote_insert([row]))
+    await session.execute(count_upsert([row]))
+    await session.commit()
 
-    # Publish updated results asynchronously
+    # Bump the live counters; subscribers get them with the next broadcast
     try:
-        res = results(poll_id, session)
-        redis_client.publish(f"poll_{poll_id}", json.dumps(res))
+        pipe = redis_client.pipeline()
+        queue_result_increments(pipe, [row])
+        await broadcasts.schedule([poll_id], pipe)
     except Exception as e:
         logger.error(f"Error publishing results: {e}")
     
     return {"status": "ok"}
 
 
-# 6) WebSocket for real-time updates (non-blocking)
+# Upper bound on entries per batch; at 3 columns per vote row the insert
+# stays well under Postgres' 32767 bind parameters
+MAX_VOTE_BATCH = 5000
+
+
+async def validate_batch(entries: list, session: AsyncSession):
+    """
+    Resolve each {poll_id, choice} entry against the cached poll definitions,
+    looked up once per distinct poll. Returns the vote rows and one status
+    per entry, in input order.
+    """
+    polls: Dict[int, Optional[PollRead]] = {}
+    now = datetime.utcnow()
+    rows, statuses = [], []
+    for entry in entries:
+        poll_id = entry.get("poll_id") if isinstance(entry, dict) else None
+        choice_idx = entry.get("choice") if isinstance(entry, dict) else None
+        if not isinstance(poll_id, int) or not isinstance(choice_idx, int) or choice_idx < 0:
+            statuses.append({"status": "error", "detail": "Invalid entry"})
+            continue
+        if poll_id not in polls:
+            polls[poll_id] = await get_poll(poll_id, session)
+        poll = polls[poll_id]
+        if not poll or choice_idx >= len(poll.options):
+            statuses.append({"status": "error", "detail": "Invalid poll or choice"})
+            continue
+        rows.append({"poll_id": poll_id, "option_id": poll.options[choice_idx].id, "voted_at": now})
+        statuses.append(None)
+    return rows, statuses
+
+
+# 5.1) Batch of votes, e.g. replayed by offline kiosks
+@app.post("/votes:batch")
+async def vote_batch(
+    payload: dict,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    {"votes": [{"poll_id": 1, "choice": 0}, ...]}. Valid entries are stored
+    with one multi-row insert and results go out once per affected poll;
+    invalid ones are reported in `items` without failing the rest.
+    """
+    entries = payload.get("votes")
+    if not isinstance(entries, list) or not entries:
+        raise HTTPException(status_code=400, detail="votes must be a non-empty list")
+    if len(entries) > MAX_VOTE_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_VOTE_BATCH} votes per batch")
+
+    rows, statuses = await validate_batch(entries, session)
+    stored = "accepted" if VOTE_INGEST_MODE == "stream" else "ok"
+    items = [item or {"status": stored} for item in statuses]
+    summary = {"accepted": len(rows), "rejected": len(entries) - len(rows), "items": items}
+    if not rows:
+        return summary
+
+    if VOTE_INGEST_MODE == "stream":
+        pipe = redis_client.pipeline(transaction=False)
+        for row in rows:
+            pipe.xadd(VOTE_STREAM, encode_vote(row["poll_id"], row["option_id"], row["voted_at"]))
+        await pipe.execute()
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=summary)
+
+    await session.execute(vote_insert(rows))
+    await session.execute(count_upsert(rows))
+    await session.commit()
+
+    try:
+        pipe = redis_client.pipeline()
+        queue_result_increments(pipe, rows)
+        await broadcasts.schedule([row["poll_id"] for row in rows], pipe)
+    except Exception as e:
+        logger.error(f"Error publishing results: {e}")
+
+    return summary
+
+
+# 6) WebSocket for real-time updates (shared per-worker pub/sub)
 @app.websocket("/polls/{poll_id}/stream")
 async def stream(ws: WebSocket, poll_id: int):
-    await ws.accept()
+    protocol, subprotocol = negotiate(ws.scope.get("subprotocols", []), ws.query_params.get("protocol"))
+    await ws.accept(subprotocol=subprotocol)
     
-    # Add connection to pool
+    # Register with the worker hub; it pushes every update for this poll
     poll_key = str(poll_id)
-    if poll_key not in active_connections:
-        active_connections[poll_key] = set()
-    active_connections[poll_key].add(ws)
-    
-    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
-    pubsub.subscribe(f"poll_{poll_id}")
+    sub = Subscriber(ws, protocol)
+    hub.register(poll_key, sub)
     
     try:
+        if protocol == DELTA:
+            # Deltas need a base to apply to
+            async with AsyncSession(engine) as session:
+                seq, res = (await current_snapshots([poll_id], session))[poll_id]
+            hub.send_snapshot(poll_key, sub, seq, res)
+        # Nothing is expected from the client, but reading keeps the
+        # disconnect detection working
         while True:
-            msg = pubsub.get_message(timeout=1.0)
-            if msg and msg["type"] == "message":
-                await ws.send_text(msg["data"])
-            await asyncio.sleep(0.1)
+            await ws.receive_text()
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for poll {poll_id}")
     except Exception as e:
         logger.error(f"WebSocket error for poll {poll_id}: {e}")
     finally:
         # Clean connection
-        if poll_key in active_connections:
-            active_connections[poll_key].discard(ws)
-            if not active_connections[poll_key]:
-                del active_connections[poll_key]
-        pubsub.close()
+        hub.unregister(poll_key, sub)
+        sub.stop()
+        try:
+            await ws.close()
+        except:
+            pass
+
+
+# Polls one /stream connection may follow at once, and name per message
+MAX_STREAM_POLLS = 1000
+MAX_SUBSCRIBE_POLLS = 100
+# Control messages bypass the HTTP rate limiter, so each connection gets its own
+STREAM_CONTROL_POLICY = RatePolicy("stream-control", limit=30, period=60, burst=10)
+
+
+def stream_message(raw: str) -> dict:
+    try:
+        msg = json.loads(raw)
+    except ValueError:
+        msg = None
+    if not isinstance(msg, dict) or msg.get("action") not in ("subscribe", "unsubscribe"):
+        raise ValueError('Expected {"action": "subscribe" or "unsubscribe", ...}')
+    return msg
+
+
+async def stream_targets(msg: dict, session: AsyncSession) -> Optional[List[int]]:
+    """Poll ids named by a subscribe/unsubscribe message; None when it names none"""
+    if msg.get("theme") is not None:
+        return list((await session.exec(
+            select(Poll.id).where(Poll.theme == msg["theme"]).order_by(Poll.id).limit(MAX_STREAM_POLLS)
+        )).all())
+    polls = msg.get("polls")
+    if polls is None:
+        return None
+    if not isinstance(polls, list) or not all(isinstance(p, int) for p in polls):
+        raise ValueError("polls must be a list of poll ids")
+    if len(polls) > MAX_SUBSCRIBE_POLLS:
+        raise ValueError(f"At most {MAX_SUBSCRIBE_POLLS} polls per message")
+    return list(dict.fromkeys(polls))
+
+
+async def stream_subscribe(sub: Subscriber, poll_ids: List[int], session: AsyncSession):
+    """Follow these polls and send their current results right away"""
+    new = [p for p in poll_ids if str(p) not in sub.polls]
+    if len(sub.polls) + len(new) > MAX_STREAM_POLLS:
+        raise ValueError(f"At most {MAX_STREAM_POLLS} polls per connection")
+    known = await get_polls(new, session)
+    found = [p for p in new if p in known]
+    missing = [p for p in new if p not in known]
+    for poll_id in found:
+        hub.register(str(poll_id), sub)
+    sub.send(json.dumps({"type": "subscribed", "polls": found, "missing": missing}))
+    if found:
+        for poll_id, (seq, res) in (await current_snapshots(found, session)).items():
+            hub.send_snapshot(str(poll_id), sub, seq, res)
+
+
+# 6.1) One WebSocket for any set of polls
+@app.websocket("/stream")
+async def multi_stream(ws: WebSocket):
+    """
+    Client messages: {"action": "subscribe"|"unsubscribe", "polls": [ids]}
+    or {"action": ..., "theme": key}; unsubscribe without either drops
+    everything. Updates use the negotiated protocol, as on /polls/{id}/stream.
+    """
+    protocol, subprotocol = negotiate(ws.scope.get("subprotocols", []), ws.query_params.get("protocol"))
+    await ws.accept(subprotocol=subprotocol)
+    sub = Subscriber(ws, protocol)
+    budget = LocalGCRABackend(maxsize=1)
+
+    try:
+        while True:
+            raw = await ws.receive_text()
+            try:
+                decision = budget.check("control", STREAM_CONTROL_POLICY)
+                if not decision.allowed:
+                    raise ValueError(f"Too many requests, retry in {math.ceil(decision.retry_after)}s")
+                msg = stream_message(raw)
+                async with AsyncSession(engine) as session:
+                    poll_ids = await stream_targets(msg, session)
+                    if msg["action"] == "subscribe":
+                        if poll_ids is None:
+                            raise ValueError("Name polls or a theme to subscribe to")
+                        await stream_subscribe(sub, poll_ids, session)
+                        continue
+                keys = sub.polls.copy() if poll_ids is None else {str(p) for p in poll_ids} & sub.polls
+                for poll_key in keys:
+                    hub.unregister(poll_key, sub)
+                sub.send(json.dumps({
+                    "type": "unsubscribed", "polls": sorted(int(k) for k in keys)
+                }))
+            except ValueError as e:
+                sub.send(json.dumps({"type": "error", "detail": str(e)}))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error on /stream: {e}")
+    finally:
+        for poll_key in sub.polls.copy():
+            hub.unregister(poll_key, sub)
+        sub.stop()
         try:
             await ws.close()
         except:
@@ -476,143 +1189,168 @@ class PollCreate(SQLModel):
     theme: Optional[str] = None
     options: List[OptionCreate]
 
+# Upper bound on polls per bulk request
+MAX_POLL_BATCH = 1000
+
+
+async def insert_polls(session: AsyncSession, polls_in: List[PollCreate]) -> List[PollRead]:
+    """
+    Store polls with their options and links in one transaction, then put
+    their definitions straight into Redis, so the first reads never go to
+    Postgres
+    """
+    polls = [(p.question, p.theme, [opt.text for opt in p.options]) for p in polls_in]
+    poll_ids = (await session.execute(poll_insert(), poll_rows(polls))).scalars().all()
+    options = option_rows(polls)
+    option_ids = (await session.execute(option_insert(), options)).scalars().all() if options else []
+    if option_ids:
+        await session.execute(link_insert(), link_rows(polls, poll_ids, option_ids))
+    for bump in theme_bumps(polls):
+        await session.execute(bump)
+    await session.commit()
+
+    created, offset = [], 0
+    for (question, theme, texts), poll_id in zip(polls, poll_ids):
+        options = [OptionRead(id=option_id, text=text)
+                   for option_id, text in zip(option_ids[offset:offset + len(texts)], texts)]
+        offset += len(texts)
+        created.append(PollRead(id=poll_id, question=question, theme=theme, options=options))
+
+    # Workers may still hold these ids from before a reseed, so every one of
+    # them (this one too) drops its copy and rereads the fresh entry; listings,
+    # theme counts and the site-wide stats move on
+    pipe = redis_client.pipeline()
+    for pr in created:
+        pipe.set(f"poll:{pr.id}", pr.json(), ex=60)
+    queue_poll_invalidation(pipe, poll_ids)
+    pipe.delete(THEMES_KEY)
+    queue_version_bumps(pipe, poll_ids, polls_changed=True)
+    queue_poll_stats(pipe, len(option_ids), polls=len(poll_ids))
+    await pipe.execute()
+    return created
+
+
 @app.post("/polls", response_model=PollRead, status_code=status.HTTP_201_CREATED)
-def create_poll(
+async def create_poll(
     poll_in: PollCreate,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
-    poll = Poll(question=poll_in.question, theme=poll_in.theme)
-    session.add(poll)
-    session.commit()
-    session.refresh(poll)
-
-    for opt_in in poll_in.options:
-        opt = Option(text=opt_in.text)
-        session.add(opt)
-        session.commit()
-        session.refresh(opt)
-        
-        # Create poll-option link
-        link = PollOptionLink(poll_id=poll.id, option_id=opt.id)
-        session.add(link)
+    return (await insert_polls(session, [poll_in]))[0]
+
+
+# 7.1) Create many polls at once
+@app.post("/polls:bulk", response_model=List[PollRead], status_code=status.HTTP_201_CREATED)
+async def create_polls(
+    polls_in: List[PollCreate],
+    session: AsyncSession = Depends(get_session)
+):
+    if not polls_in:
+        raise HTTPException(status_code=400, detail="No polls given")
+    if len(polls_in) > MAX_POLL_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_POLL_BATCH} polls per request")
+    return await insert_polls(session, polls_in)
 
-    session.commit()
 
-    # Invalidate poll cache
-    redis_client.delete(f"poll:{poll.id}")
+# 8) General stats from the Redis counters (no table scans)
+async def load_stats() -> Dict[str, int]:
+    """Build the counters from Postgres; only needed when Redis has lost them"""
+    queries = stats_snapshot_queries()
+    async with AsyncSession(engine) as session:
+        totals = (await session.exec(queries["totals"])).one()
+        voted_polls = (await session.exec(queries["voted_polls"])).all()
+        minutes = (await session.exec(queries["minutes"])).all()
+    pipe = redis_client.pipeline()
+    queue_stats_load(pipe, totals, voted_polls, minutes)
+    await pipe.execute()
+    # Waiters may want the buckets too
+    return await cached_stats(recent=True)
 
-    # Reload with options
-    poll = session.exec(
-        select(Poll).options(selectinload(Poll.options))
-        .where(Poll.id == poll.id)
-    ).one()
-    return PollRead.from_orm(poll)
+
+async def cached_stats(recent: bool = False) -> Optional[Dict[str, int]]:
+    pipe = redis_client.pipeline(transaction=False)
+    queue_stats_read(pipe, recent)
+    return stats_from_replies(await pipe.execute())
+
+
+async def read_stats(recent: bool = False) -> Dict[str, int]:
+    """Site-wide counters; `recent` adds recent_votes_24h from the minute buckets"""
+    stats = await cached_stats(recent)
+    cache_lookup("stats", stats is not None)
+    if stats is None:
+        stats = await flight.do(STATS_LOADED, load_stats, peek=lambda: cached_stats(recent))
+    return stats
 
 
-# 8) General stats with caching
 @app.get("/stats")
-def get_stats(session: Session = Depends(get_session)):
-    key = "stats:general"
-    cached = redis_client.get(key)
-    if cached:
-        return json.loads(cached)
+async def get_stats():
+    stats = await read_stats()
+    return {
+        "total_polls": stats["total_polls"],
+        "total_votes": stats["total_votes"],
+        "polls_with_votes": stats["polls_with_votes"]
+    }
+
+
+# 9) Advanced metrics for scalability monitoring
+async def compute_metrics() -> dict:
+    stats = await read_stats(recent=True)
+    total_polls = stats["total_polls"]
+    total_votes = stats["total_votes"]
+    polls_with_votes = stats["polls_with_votes"]
+    # Sum of the last 1440 per-minute buckets
+    recent_votes = stats["recent_votes_24h"]
+    avg_options_per_poll = stats["total_options"] / total_polls if total_polls else 0.0
     
-    total_polls      = session.exec(select(func.count(Poll.id))).one()
-    total_votes      = session.exec(select(func.count(Vote.id))).one()
-    polls_with_votes = session.exec(
-        select(func.count(func.distinct(Vote.poll_id)))
-    ).one()
+    # System health metrics
+    active_ws_connections = sum(len(conns) for conns in active_connections.values())
     
-    stats = {
-        "total_polls": total_polls,
-        "total_votes": total_votes,
-        "polls_with_votes": polls_with_votes
-    }
+    # Redis info
+    redis_info = await redis_client.info()
+    redis_memory_used = redis_info.get('used_memory_human', 'N/A')
+    redis_connected_clients = redis_info.get('connected_clients', 0)
     
-    # Cache stats for 5 minutes
-    redis_client.set(key, json.dumps(stats), ex=300)
-    return stats
+    return {
+        "database": {
+            "total_polls": total_polls,
+            "total_votes": total_votes,
+            "total_options": stats["total_options"],
+            "polls_with_votes": polls_with_votes,
+            "avg_options_per_poll": round(float(avg_options_per_poll), 2),
+            "votes_per_poll_avg": round(total_votes / max(total_polls, 1), 2)
+        },
+        "performance": {
+            "recent_votes_24h": recent_votes,
+            "vote_rate_per_hour": round(recent_votes / 24, 2),
+            "active_websocket_connections": active_ws_connections,
+            "polls_participation_rate": round((polls_with_votes / max(total_polls, 1)) * 100, 2)
+        },
+        "system": {
+            "redis_memory_used": redis_memory_used,
+            "redis_connected_clients": redis_connected_clients,
+            "app_active_polls": len(active_connections),
+            "timestamp": datetime.utcnow().isoformat()
+        },
+        "scalability_indicators": {
+            "horizontal_scaling_ready": True,
+            "cache_hit_potential": "high" if total_votes > 100 else "medium",
+            "load_distribution": "optimal" if active_ws_connections < 1000 else "monitor"
+        }
+    }
 
 
-# 9) Advanced metrics for scalability monitoring
 @app.get("/metrics")
-def get_metrics(session: Session = Depends(get_session)):
+async def get_metrics():
     """
     Enhanced metrics endpoint for monitoring scalability and performance.
     Demonstrates advanced monitoring capabilities for scalable systems.
     """
-    key = "metrics:advanced"
-    cached = redis_client.get(key)
-    if cached:
-        return json.loads(cached)
-    
     try:
-        # Database metrics
-        total_polls = session.exec(select(func.count(Poll.id))).one()
-        total_votes = session.exec(select(func.count(Vote.id))).one()
-        total_options = session.exec(select(func.count(Option.id))).one()
-        
-        # Performance metrics
-        polls_with_votes = session.exec(
-            select(func.count(func.distinct(Vote.poll_id)))
-        ).one()
-        
-        # Calculate average options per poll safely
-        avg_options_query = session.exec(
-            select(func.avg(func.count(Option.id)))
-            .select_from(Option)
-            .join(PollOptionLink)
-            .group_by(PollOptionLink.poll_id)
-        ).first()
-        avg_options_per_poll = float(avg_options_query) if avg_options_query else 0.0
-        
-        # Recent activity (last 24 hours)
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        recent_votes = session.exec(
-            select(func.count(Vote.id))
-            .where(Vote.voted_at >= yesterday)
-        ).one()
-        
-        # System health metrics
-        active_ws_connections = sum(len(conns) for conns in active_connections.values())
-        
-        # Redis info
-        redis_info = redis_client.info()
-        redis_memory_used = redis_info.get('used_memory_human', 'N/A')
-        redis_connected_clients = redis_info.get('connected_clients', 0)
-        
-        metrics = {
-            "database": {
-                "total_polls": total_polls,
-                "total_votes": total_votes,
-                "total_options": total_options,
-                "polls_with_votes": polls_with_votes,
-                "avg_options_per_poll": round(float(avg_options_per_poll), 2),
-                "votes_per_poll_avg": round(total_votes / max(total_polls, 1), 2)
-            },
-            "performance": {
-                "recent_votes_24h": recent_votes,
-                "vote_rate_per_hour": round(recent_votes / 24, 2),
-                "active_websocket_connections": active_ws_connections,
-                "polls_participation_rate": round((polls_with_votes / max(total_polls, 1)) * 100, 2)
-            },
-            "system": {
-                "redis_memory_used": redis_memory_used,
-                "redis_connected_clients": redis_connected_clients,
-                "app_active_polls": len(active_connections),
-                "timestamp": datetime.utcnow().isoformat()
-            },
-            "scalability_indicators": {
-                "horizontal_scaling_ready": True,
-                "cache_hit_potential": "high" if total_votes > 100 else "medium",
-                "load_distribution": "optimal" if active_ws_connections < 1000 else "monitor"
-            }
-        }
-        
-        # Cache metrics for 30 seconds (real-time but not overwhelming)
-        redis_client.set(key, json.dumps(metrics), ex=30)
+        # Counters make this cheap; the short cache only spares the 1440-key
+        # bucket read and INFO when dashboards poll hard
+        metrics = await swr.get("metrics:advanced", compute_metrics, soft_ttl=5, hard_ttl=60)
+        # Per-worker figures are never served from the shared cache
+        metrics["system"]["poll_cache"] = poll_cache.stats()
         return metrics
-        
     except Exception as e:
         logger.error(f"Error generating metrics: {e}")
         return {
@@ -621,4 +1359,11 @@ def get_metrics(session: Session = Depends(get_session)):
                 "active_connections": len(active_connections),
                 "timestamp": datetime.utcnow().isoformat()
             }
-        }
\ No newline at end of file
+        }
+
+
+# 10) Prometheus exposition, merged across every worker of this container
+@app.get("/metrics/prometheus")
+def prometheus_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
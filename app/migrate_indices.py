@@ -5,49 +5,146 @@ Script para migrar índices en la base de datos existente
 
 import os
 import sys
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import Session, select
 import logging
 
+from models import PollOptionCount, Theme, Vote, VoteRollup
+from vote_store import rebuild_counts
+from themes import themes_upsert, theme_counts_refresh
+from partitions import ensure_vote_partitions, is_partitioned
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = "postgresql://postgres:pass@db:5432/votes"
 
+# SQLSTATE duplicate_table, also raised for an index name that is taken
+DUPLICATE_TABLE = "42P07"
+
 def create_indices():
     """Create indices to optimize performance"""
     engine = create_engine(DATABASE_URL)
     
+    # The vote table's only index comes with partition_votes()
     indices = [
-        # Índices para la tabla vote
-        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vote_poll_id ON vote(poll_id);",
-        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vote_option_id ON vote(option_id);",
-        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vote_poll_option ON vote(poll_id, option_id);",
-        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vote_voted_at ON vote(voted_at);",
-        
         # Índices para la tabla poll
         "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_poll_is_active ON poll(is_active);",
         "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_poll_created_at ON poll(created_at);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_poll_theme_id ON poll(theme, id);",
         
         # Índices para la tabla de enlaces
         "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_poll_option_poll_id ON polloption(poll_id);",
         "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_poll_option_option_id ON polloption(option_id);",
     ]
     
-    with engine.connect() as conn:
+    # Fresh database: main.py creates the tables with their indices
+    if not inspect(engine).has_table("poll"):
+        logger.info("No poll table yet, skipping indices")
+        return
+    
+    # CREATE INDEX CONCURRENTLY refuses to run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # An interrupted concurrent build leaves an INVALID index behind,
+        # which IF NOT EXISTS would keep forever
+        invalid = conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid AND c.relname LIKE 'idx_poll%'"
+        )).scalars().all()
+        for name in invalid:
+            logger.info(f"Eliminando índice inválido: {name}")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
         for idx_sql in indices:
             try:
                 logger.info(f"Creando índice: {idx_sql}")
                 conn.execute(text(idx_sql))
-                conn.commit()
                 logger.info("✓ Índice creado exitosamente")
-            except Exception as e:
-                logger.warning(f"Error creando índice (puede que ya exista): {e}")
-                continue
+            except ProgrammingError as e:
+                # Only a race with another run creating the same index is expected
+                if getattr(e.orig, "pgcode", None) != DUPLICATE_TABLE:
+                    raise
+                logger.warning(f"El índice ya existe: {e.orig}")
+
+def partition_votes():
+    """
+    Turn a plain vote table into the day-partitioned one, copying every row.
+    Runs in one transaction; votes are blocked until it commits.
+    """
+    engine = create_engine(DATABASE_URL)
+    
+    if not inspect(engine).has_table("vote"):
+        logger.info("No vote table yet, skipping partitioning")
+        return
+    
+    with engine.begin() as conn:
+        VoteRollup.__table__.create(conn, checkfirst=True)
+        if is_partitioned(conn):
+            logger.info("vote is already partitioned")
+            return
+        
+        logger.info("Converting vote into a partitioned table...")
+        conn.execute(text("LOCK TABLE vote IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text("ALTER TABLE vote RENAME TO vote_unpartitioned"))
+        conn.execute(text("ALTER TABLE vote_unpartitioned RENAME CONSTRAINT vote_pkey TO vote_unpartitioned_pkey"))
+        # Index names are schema-wide; the old ones go away with the table anyway
+        for index in ("idx_vote_poll_id", "idx_vote_option_id", "idx_vote_poll_option", "idx_vote_voted_at"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        Vote.__table__.create(conn)
+        
+        first = conn.execute(text("SELECT min(voted_at) FROM vote_unpartitioned")).scalar()
+        created = ensure_vote_partitions(conn, start=first.date() if first else None)
+        moved = conn.execute(text(
+            "INSERT INTO vote (id, poll_id, option_id, user_id, voted_at) "
+            "SELECT id, poll_id, option_id, user_id, voted_at FROM vote_unpartitioned"
+        )).rowcount
+        
+        # The new id sequence got a suffixed name while the old one existed
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('vote', 'id')")).scalar()
+        conn.execute(text(f"SELECT setval('{sequence}', GREATEST((SELECT max(id) FROM vote), 1))"))
+        conn.execute(text("DROP TABLE vote_unpartitioned"))
+        if sequence.split(".")[-1] != "vote_id_seq":
+            conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO vote_id_seq"))
+    logger.info(f"✓ vote partitioned by day: {created} partitions, {moved} votes moved")
+
+def create_vote_counts():
+    """Create the per-option counter table and backfill it from existing votes"""
+    engine = create_engine(DATABASE_URL)
+    
+    # Fresh database: main.py creates every table and there is nothing to backfill
+    if not inspect(engine).has_table("vote"):
+        logger.info("No vote table yet, skipping counter backfill")
+        return
+    
+    PollOptionCount.__table__.create(engine, checkfirst=True)
+    with Session(engine) as session:
+        if session.exec(select(PollOptionCount)).first() is None:
+            logger.info("Backfilling polloptioncount from vote")
+            rebuild_counts(session)
+            logger.info("✓ Counters backfilled")
+
+def create_themes():
+    """Create the theme table, load the built-in themes and count their polls"""
+    engine = create_engine(DATABASE_URL)
+    
+    if not inspect(engine).has_table("poll"):
+        logger.info("No poll table yet, skipping theme migration")
+        return
+    
+    Theme.__table__.create(engine, checkfirst=True)
+    with Session(engine) as session:
+        session.exec(themes_upsert())
+        session.exec(theme_counts_refresh())
+        session.commit()
+    logger.info("✓ Themes loaded and counted")
 
 if __name__ == "__main__":
     try:
         create_indices()
+        partition_votes()
+        create_vote_counts()
+        create_themes()
         logger.info("✓ Index migration completed")
     except Exception as e:
         logger.error(f"❌ Migration error: {e}")
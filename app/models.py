@@ -42,6 +42,8 @@ class Poll(SQLModel, table=True):
     __table_args__ = (
         Index('idx_poll_is_active', 'is_active'),
         Index('idx_poll_created_at', 'created_at'),
+        # Keyset pages of a theme: WHERE theme = ? AND id > ? ORDER BY id
+        Index('idx_poll_theme_id', 'theme', 'id'),
     )
 
 class Option(SQLModel, table=True):
@@ -57,20 +59,53 @@ class Option(SQLModel, table=True):
     votes: List["Vote"] = Relationship(back_populates="option")
 
 class Vote(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    """
+    Raw votes, range-partitioned by day on voted_at (see partitions.py).
+    The partition key has to be part of the primary key.
+    """
+    id: Optional[int] = Field(
+        default=None, primary_key=True, sa_column_kwargs={"autoincrement": True}
+    )
     poll_id:   Optional[int] = Field(default=None, foreign_key="poll.id")
     option_id: Optional[int] = Field(default=None, foreign_key="option.id")
     user_id:   Optional[int] = Field(default=None)  # ya no es FK
-    voted_at:  datetime      = Field(default_factory=datetime.utcnow)
+    voted_at:  datetime      = Field(default_factory=datetime.utcnow, primary_key=True)
 
     # relaciones
     poll:   Poll   = Relationship(back_populates="votes")
     option: Option = Relationship(back_populates="votes")
     
-    # Índices para optimizar agregaciones
+    # Counters live in polloptioncount, so one index covers the per-poll
+    # aggregations; time ranges are served by partition pruning
     __table_args__ = (
-        Index('idx_vote_poll_id', 'poll_id'),
-        Index('idx_vote_option_id', 'option_id'),
         Index('idx_vote_poll_option', 'poll_id', 'option_id'),
-        Index('idx_vote_voted_at', 'voted_at'),
+        {"postgresql_partition_by": "RANGE (voted_at)"},
     )
+
+class PollOptionCount(SQLModel, table=True):
+    """Running vote total per poll option, kept in step with every vote insert"""
+    __tablename__ = "polloptioncount"
+
+    poll_id:   int = Field(foreign_key="poll.id", primary_key=True)
+    option_id: int = Field(foreign_key="option.id", primary_key=True)
+    count:     int = Field(default=0)
+
+class VoteRollup(SQLModel, table=True):
+    """Hourly vote totals of retired vote partitions, whose raw rows are gone"""
+    __tablename__ = "voterollup"
+
+    poll_id:   int      = Field(foreign_key="poll.id", primary_key=True)
+    option_id: int      = Field(foreign_key="option.id", primary_key=True)
+    hour:      datetime = Field(primary_key=True)
+    count:     int      = Field(default=0)
+
+class Theme(SQLModel, table=True):
+    """Poll category shown on the landing page; poll_count follows every poll insert"""
+    key:         str = Field(primary_key=True)  # value stored in Poll.theme
+    position:    int = Field(default=0)
+    name:        str
+    slug:        str
+    description: str = Field(default="")
+    color:       Optional[str] = None
+    icon:        Optional[str] = None
+    poll_count:  int = Field(default=0)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Day partitions of the vote table:
+  maintain - create the partitions for the coming days, move stray rows out
+             of the default partition, and retire partitions older than the
+             retention window: roll them up into voterollup (per poll, option
+             and hour), then detach or drop them (default)
+  status   - list the attached partitions with their estimated row counts
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import create_engine, text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:pass@db:5432/votes")
+
+PARTITION_PREFIX = "vote_p"
+DEFAULT_PARTITION = "vote_default"
+# Detached partitions are renamed so the day can be partitioned again
+ARCHIVE_PREFIX = "vote_archive_"
+# Days of partitions kept ready ahead of today
+PREMAKE_DAYS = int(os.getenv("VOTE_PARTITION_PREMAKE_DAYS", "7"))
+# Raw votes are kept this many days; older partitions only live on as rollups
+RETENTION_DAYS = int(os.getenv("VOTE_RETENTION_DAYS", "90"))
+# "detach" leaves retired partitions as standalone vote_archive_* tables
+RETENTION_ACTION = os.getenv("VOTE_RETENTION_ACTION", "detach")
+# Serializes partition DDL between app workers and the maintenance task
+PARTITION_LOCK = 0x766F7465
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> Optional[date]:
+    match = re.fullmatch(rf"{PARTITION_PREFIX}(\d{{8}})", name)
+    return datetime.strptime(match.group(1), "%Y%m%d").date() if match else None
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('vote'))"
+    )).scalar()
+
+
+def attached_partitions(conn) -> List[str]:
+    return list(conn.execute(text(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'vote'::regclass ORDER BY c.relname
+        """
+    )).scalars())
+
+
+def create_partition(conn, day: date):
+    """
+    Attach the partition for `day`. Rows that already landed in the default
+    partition for that day are moved into it first, or Postgres would refuse.
+    """
+    name = partition_name(day)
+    bounds = {"lo": day, "hi": day + timedelta(days=1)}
+    stray = conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE voted_at >= :lo AND voted_at < :hi)"
+    ), bounds).scalar()
+    if not stray:
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF vote FOR VALUES FROM ('{bounds['lo']}') TO ('{bounds['hi']}')"
+        ))
+        return
+    conn.execute(text(f"CREATE TABLE {name} (LIKE vote INCLUDING DEFAULTS)"))
+    moved = conn.execute(text(
+        f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE voted_at >= :lo AND voted_at < :hi RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """
+    ), bounds).rowcount
+    conn.execute(text(
+        f"ALTER TABLE vote ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['lo']}') TO ('{bounds['hi']}')"
+    ))
+    logger.info(f"Moved {moved} votes from {DEFAULT_PARTITION} into {name}")
+
+
+def ensure_vote_partitions(conn, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Make sure the default partition and one partition per day from `start`
+    (default today) to `end` (default PREMAKE_DAYS ahead) exist. Takes a sync
+    connection inside a transaction; returns how many partitions were created.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK})
+    if not is_partitioned(conn):
+        return 0
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF vote DEFAULT"))
+
+    today = datetime.utcnow().date()
+    day = start or today
+    end = end or today + timedelta(days=PREMAKE_DAYS)
+    existing = set(attached_partitions(conn))
+    created = 0
+    while day <= end:
+        if partition_name(day) not in existing:
+            create_partition(conn, day)
+            created += 1
+        day += timedelta(days=1)
+    return created
+
+
+def retire_partition(conn, name: str, drop: bool):
+    """
+    Roll a partition up into voterollup and take it out of the vote table,
+    in one transaction so rebuild_counts() sees its votes exactly once
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK})
+    rolled = conn.execute(text(
+        f"""
+        INSERT INTO voterollup (poll_id, option_id, hour, count)
+        SELECT poll_id, option_id, date_trunc('hour', voted_at), count(*)
+        FROM {name}
+        WHERE poll_id IS NOT NULL AND option_id IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (poll_id, option_id, hour) DO UPDATE SET count = EXCLUDED.count
+        """
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE vote DETACH PARTITION {name}"))
+    if drop:
+        conn.execute(text(f"DROP TABLE {name}"))
+        logger.info(f"Retired {name}: {rolled} hourly rollup rows, dropped")
+    else:
+        archive = ARCHIVE_PREFIX + name[len(PARTITION_PREFIX):]
+        conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive}"))
+        # An archive must not stop polls from being deleted
+        foreign_keys = conn.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype = 'f'"
+        ), {"t": archive}).scalars().all()
+        for fk in foreign_keys:
+            conn.execute(text(f'ALTER TABLE {archive} DROP CONSTRAINT "{fk}"'))
+        logger.info(f"Retired {name}: {rolled} hourly rollup rows, detached as {archive}")
+
+
+def maintain(engine, retention_days: int = RETENTION_DAYS, action: str = RETENTION_ACTION):
+    today = datetime.utcnow().date()
+    cutoff = today - timedelta(days=retention_days)
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            logger.warning("vote is not partitioned yet; run migrate_indices.py")
+            return
+        created = ensure_vote_partitions(conn)
+        # Give rows that fell into the default partition a home too
+        oldest = conn.execute(text(f"SELECT min(voted_at) FROM {DEFAULT_PARTITION}")).scalar()
+        if oldest is not None and oldest.date() < today:
+            created += ensure_vote_partitions(conn, max(oldest.date(), cutoff), today)
+    logger.info(f"✓ {created} partitions created, ready up to {today + timedelta(days=PREMAKE_DAYS)}")
+
+    with engine.connect() as conn:
+        expired = [
+            name for name in attached_partitions(conn)
+            if (day := partition_day(name)) is not None and day < cutoff
+        ]
+    for name in expired:
+        with engine.begin() as conn:
+            retire_partition(conn, name, drop=(action == "drop"))
+    logger.info(f"✓ {len(expired)} partitions older than {cutoff} retired")
+
+    with engine.connect() as conn:
+        stuck = conn.execute(text(
+            f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE voted_at < :cutoff"
+        ), {"cutoff": cutoff}).scalar()
+    if stuck:
+        logger.warning(f"{stuck} votes older than {cutoff} are left in {DEFAULT_PARTITION}")
+
+
+def status(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            """
+            SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'vote'::regclass ORDER BY c.relname
+            """
+        )).all()
+    for name, estimate, size in rows:
+        logger.info(f"{name}: ~{max(estimate, 0)} rows, {size / 1048576:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vote partition maintenance")
+    parser.add_argument("command", nargs="?", default="maintain", choices=["maintain", "status"])
+    parser.add_argument("--interval", type=float, default=0,
+                        help="with maintain: repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+    try:
+        if args.command == "status":
+            status(engine)
+        else:
+            while True:
+                maintain(engine)
+                if not args.interval:
+                    break
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"❌ Partition maintenance error: {e}")
+        sys.exit(1)
@@ -0,0 +1,82 @@
+# app/poll_store.py
+
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+
+from models import Poll, Option, PollOptionLink
+from themes import theme_count_bump
+
+# A new poll is (question, theme, [option texts]). Creating any number of
+# them takes three INSERTs: polls and options each come back with their ids
+# in input order (RETURNING, sorted by parameter order), which is all the
+# link rows need. Run the statements in one transaction.
+NewPoll = Tuple[str, Optional[str], List[str]]
+
+# Every worker keeps parsed poll definitions in memory. Whoever stores polls
+# publishes their ids here (comma-separated), or ALL_POLLS after a reseed,
+# and every worker drops its copies.
+POLL_INVALIDATE_CHANNEL = "cache:invalidate:poll"
+ALL_POLLS = "*"
+
+
+def poll_insert():
+    """Executemany INSERT for poll rows, returning ids in parameter order"""
+    return insert(Poll).returning(Poll.id, sort_by_parameter_order=True)
+
+
+def option_insert():
+    """Executemany INSERT for option rows, returning ids in parameter order"""
+    return insert(Option).returning(Option.id, sort_by_parameter_order=True)
+
+
+def link_insert():
+    return insert(PollOptionLink)
+
+
+def poll_rows(polls: Sequence[NewPoll], now: Optional[datetime] = None) -> List[dict]:
+    now = now or datetime.utcnow()
+    return [
+        {"question": question, "theme": theme, "created_at": now, "is_active": True}
+        for question, theme, _ in polls
+    ]
+
+
+def option_rows(polls: Sequence[NewPoll], now: Optional[datetime] = None) -> List[dict]:
+    now = now or datetime.utcnow()
+    return [{"text": text, "created_at": now} for _, _, texts in polls for text in texts]
+
+
+def link_rows(polls: Sequence[NewPoll], poll_ids: List[int], option_ids: List[int]) -> List[dict]:
+    """polloption rows pairing each poll with its slice of the returned option ids"""
+    rows, offset = [], 0
+    for (_, _, texts), poll_id in zip(polls, poll_ids):
+        for option_id in option_ids[offset:offset + len(texts)]:
+            rows.append({"poll_id": poll_id, "option_id": option_id})
+        offset += len(texts)
+    return rows
+
+
+def queue_poll_invalidation(pipe, poll_ids: Optional[Iterable[int]] = None):
+    """Queue the message that drops these polls (all of them for None) from every worker"""
+    if poll_ids is None:
+        pipe.publish(POLL_INVALIDATE_CHANNEL, ALL_POLLS)
+        return
+    ids = ",".join(str(p) for p in poll_ids)
+    if ids:
+        pipe.publish(POLL_INVALIDATE_CHANNEL, ids)
+
+
+def invalidated_polls(data: str) -> Optional[List[int]]:
+    """Poll ids named by a POLL_INVALIDATE_CHANNEL message, None for all of them"""
+    if data == ALL_POLLS:
+        return None
+    return [int(p) for p in data.split(",")]
+
+
+def theme_bumps(polls: Sequence[NewPoll]):
+    """One poll_count update per theme the new polls belong to"""
+    counts = Counter(theme for _, theme, _ in polls if theme)
+    return [theme_count_bump(theme, n) for theme, n in sorted(counts.items())]
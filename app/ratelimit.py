@@ -0,0 +1,174 @@
+# app/ratelimit.py
+
+import re
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# GCRA in one round-trip. Stores a single "theoretical arrival time" per
+# client, so memory is O(1) per key, and rejected requests don't consume
+# capacity. Time comes from the Redis server so app hosts may drift.
+#   KEYS[1] = bucket key
+#   ARGV[1] = emission interval (ms per request)
+#   ARGV[2] = burst tolerance (ms)
+# Returns {allowed, retry_after_ms, remaining}
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission
+local excess = new_tat - now - tolerance
+if excess > 0 then
+    return {0, math.ceil(excess), 0}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, 0, math.floor((tolerance - (new_tat - now)) / emission)}
+"""
+
+
+class RatePolicy:
+    """
+    `limit` requests per `period` seconds, allowing up to `burst` back to
+    back, for requests whose method and path match.
+    """
+    def __init__(self, name: str, limit: int, period: int = 60,
+                 burst: Optional[int] = None, methods: Optional[List[str]] = None,
+                 path: Optional[str] = None):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.burst = burst or limit
+        self.methods = {m.upper() for m in methods} if methods else None
+        self.path = re.compile(path) if path else None
+        # GCRA parameters in milliseconds
+        self.emission_ms = period * 1000 / limit
+        self.tolerance_ms = self.emission_ms * self.burst
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method.upper() not in self.methods:
+            return False
+        return self.path is None or bool(self.path.match(path))
+
+
+class Decision:
+    def __init__(self, allowed: bool, retry_after: float = 0.0, remaining: int = 0):
+        self.allowed = allowed
+        self.retry_after = retry_after
+        self.remaining = remaining
+
+
+class RateLimiterBackend(ABC):
+    """Interface for limiter storage; allow() is called once per request"""
+    @abstractmethod
+    async def allow(self, key: str, policy: RatePolicy) -> Decision:
+        ...
+
+
+class LocalGCRABackend(RateLimiterBackend):
+    """
+    GCRA kept in process memory. Exact for a single worker; used on its own
+    for development and as the pre-filter in front of Redis.
+    """
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    async def allow(self, key: str, policy: RatePolicy) -> Decision:
+        return self.check(key, policy)
+
+    def check(self, key: str, policy: RatePolicy) -> Decision:
+        now = time.monotonic() * 1000
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + policy.emission_ms
+        excess = new_tat - now - policy.tolerance_ms
+        if excess > 0:
+            return Decision(False, excess / 1000)
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        while len(self._tat) > self.maxsize:
+            self._tat.popitem(last=False)
+        return Decision(True, 0.0, int((policy.tolerance_ms - (new_tat - now)) // policy.emission_ms))
+
+
+class RedisGCRABackend(RateLimiterBackend):
+    """Shared GCRA across workers and instances, one EVALSHA per request"""
+    def __init__(self, redis_client, prefix: str = "rl"):
+        self.prefix = prefix
+        self._script = redis_client.register_script(GCRA_SCRIPT)
+
+    async def allow(self, key: str, policy: RatePolicy) -> Decision:
+        allowed, retry_ms, remaining = await self._script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[policy.emission_ms, policy.tolerance_ms]
+        )
+        return Decision(bool(allowed), int(retry_ms) / 1000, int(remaining))
+
+
+class LocalPrefilter:
+    """
+    Rejects clients that are certainly over their limit without asking Redis:
+    either this worker alone has already seen more than the policy allows, or
+    Redis rejected them recently and their retry-after hasn't passed.
+    """
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._local = LocalGCRABackend(maxsize)
+        self._blocked: "OrderedDict[str, float]" = OrderedDict()
+        self.rejections = 0
+
+    def check(self, key: str, policy: RatePolicy) -> Optional[Decision]:
+        until = self._blocked.get(key)
+        if until is not None:
+            remaining = until - time.monotonic()
+            if remaining > 0:
+                self.rejections += 1
+                return Decision(False, remaining)
+            del self._blocked[key]
+        decision = self._local.check(key, policy)
+        if not decision.allowed:
+            self.rejections += 1
+            return decision
+        return None
+
+    def block(self, key: str, retry_after: float):
+        self._blocked[key] = time.monotonic() + retry_after
+        self._blocked.move_to_end(key)
+        while len(self._blocked) > self.maxsize:
+            self._blocked.popitem(last=False)
+
+
+class RateLimiter:
+    """Picks the policy for a request and asks the backend for a decision"""
+    def __init__(self, backend: RateLimiterBackend, policies: List[RatePolicy],
+                 default: RatePolicy, prefilter: Optional[LocalPrefilter] = None):
+        self.backend = backend
+        self.policies = policies
+        self.default = default
+        self.prefilter = prefilter
+
+    def policy_for(self, method: str, path: str) -> RatePolicy:
+        for policy in self.policies:
+            if policy.matches(method, path):
+                return policy
+        return self.default
+
+    async def check(self, client: str, method: str, path: str) -> Tuple[RatePolicy, Decision]:
+        policy = self.policy_for(method, path)
+        key = f"{policy.name}:{client}"
+        if self.prefilter is not None:
+            decision = self.prefilter.check(key, policy)
+            if decision is not None:
+                return policy, decision
+        decision = await self.backend.allow(key, policy)
+        if not decision.allowed and self.prefilter is not None:
+            self.prefilter.block(key, decision.retry_after)
+        return policy, decision
@@ -0,0 +1,365 @@
+# app/realtime.py
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Set, Tuple, Union
+
+import redis.asyncio as redis_async
+from fastapi import WebSocket
+
+from broadcast import broadcast_message
+from instrumentation import WS_CONNECTIONS, WS_FANOUT, WS_MESSAGES, WS_SLOW_CONSUMERS
+from ws_protocol import DELTA, JSON, PollState, delta_frame, frame_seq, snapshot_frame
+
+logger = logging.getLogger(__name__)
+
+# Fan-out never waits on a socket: frames are queued per subscriber and a
+# writer task per socket sends them. A send that takes longer than
+# WS_SEND_TIMEOUT seconds, or a queue that hasn't been emptied for WS_MAX_LAG
+# seconds, gets the consumer disconnected (close code 1013, try again later).
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+WS_MAX_LAG = float(os.getenv("WS_MAX_LAG", "30"))
+# Replies to client requests waiting to be sent; a client sending requests
+# without reading the answers is disconnected past this
+MAX_CONTROL_FRAMES = 64
+SLOW_CONSUMER_CLOSE = 1013
+
+Frame = Union[str, bytes]
+
+
+class Subscriber:
+    """
+    One WebSocket, the polls it follows (one for /polls/{id}/stream, any
+    number for /stream), its protocol and, for delta, the seq each poll is
+    synced to.
+    Outbound frames wait in a bounded queue: at most one per poll, where a
+    newer broadcast replaces the one still waiting (latest snapshot wins),
+    plus replies to the client's own requests, which go first.
+    """
+    def __init__(self, ws: WebSocket, protocol: str = JSON):
+        self.ws = ws
+        self.protocol = protocol
+        self.polls: Set[str] = set()
+        self.synced: Dict[str, int] = {}
+        self.pending: Dict[str, Frame] = {}
+        self.control: Deque[str] = deque()
+        self.closed = False
+        # When the queue last went from empty to waiting
+        self.behind_since: Optional[float] = None
+        self._wake = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Task] = None
+
+    def push(self, poll_key: str, frame: Frame):
+        """Queue a frame for a followed poll, replacing an older one still waiting"""
+        if self.closed:
+            return
+        waiting = self.pending.get(poll_key)
+        if waiting is not None:
+            WS_MESSAGES.labels("coalesced").inc()
+            if frame_seq(waiting) > frame_seq(frame):
+                return
+        self.pending[poll_key] = frame
+        self._kick()
+
+    def send(self, text: str):
+        """Queue a reply to the client, sent ahead of any poll frames"""
+        if self.closed:
+            return
+        if len(self.control) >= MAX_CONTROL_FRAMES:
+            self.disconnect("queue_full")
+            return
+        self.control.append(text)
+        self._kick()
+
+    def discard(self, poll_key: str):
+        """Forget the frame still waiting for a poll no longer followed"""
+        if self.pending.pop(poll_key, None) is not None:
+            WS_MESSAGES.labels("dropped").inc()
+
+    def stop(self):
+        """Stop sending; whatever is still queued is dropped"""
+        if self.closed:
+            return
+        self.closed = True
+        dropped = len(self.pending) + len(self.control)
+        if dropped:
+            WS_MESSAGES.labels("dropped").inc(dropped)
+        self.pending.clear()
+        self.control.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    def disconnect(self, reason: str):
+        """Give up on a consumer that can't keep up; its stream handler sees the close"""
+        if self.closed:
+            return
+        logger.warning(f"Disconnecting slow WebSocket consumer ({reason})")
+        WS_SLOW_CONSUMERS.labels(reason).inc()
+        self.stop()
+        self._closing = asyncio.create_task(self._close())
+
+    def _kick(self):
+        now = time.monotonic()
+        if self.behind_since is None:
+            self.behind_since = now
+        elif now - self.behind_since > WS_MAX_LAG:
+            self.disconnect("lagging")
+            return
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write())
+        self._wake.set()
+
+    async def _write(self):
+        while not self.closed:
+            await self._wake.wait()
+            self._wake.clear()
+            while self.control or self.pending:
+                if self.control:
+                    frame = self.control.popleft()
+                else:
+                    frame = self.pending.pop(next(iter(self.pending)))
+                try:
+                    await asyncio.wait_for(self._send(frame), WS_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    WS_MESSAGES.labels("failed").inc()
+                    self.disconnect("send_timeout")
+                    return
+                except Exception:
+                    # Socket went away between messages; the stream handler closes it
+                    WS_MESSAGES.labels("failed").inc()
+                    self.stop()
+                    return
+                WS_MESSAGES.labels("sent").inc()
+            self.behind_since = None
+
+    async def _send(self, frame: Frame):
+        if isinstance(frame, bytes):
+            await self.ws.send_bytes(frame)
+        else:
+            await self.ws.send_text(frame)
+
+    async def _close(self):
+        # The server bounds the closing handshake itself and drops the
+        # connection if the client never answers
+        try:
+            await self.ws.close(code=SLOW_CONSUMER_CLOSE)
+        except Exception:
+            pass
+
+
+class Listener:
+    """
+    An HTTP request waiting on the broadcasts of one poll (long-poll, SSE).
+    Only the newest broadcast not yet taken is kept, so a slow reader skips
+    straight to the latest results.
+    """
+    def __init__(self, seq: int = -1):
+        # Newest seq seen; older broadcasts are ignored
+        self.seq = seq
+        self.data: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    def put(self, seq: int, data: str):
+        if seq <= self.seq:
+            return
+        self.seq = seq
+        self.data = data
+        self._ready.set()
+
+    def skip_to(self, seq: int):
+        """The client has the results of `seq`; drop anything waiting that isn't newer"""
+        if seq >= self.seq:
+            self.seq = seq
+            self.data = None
+            self._ready.clear()
+
+    async def next(self, timeout: float) -> Optional[Tuple[int, str]]:
+        """(seq, broadcast) once one newer than the last is in, or None after `timeout` seconds"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        data, self.data = self.data, None
+        return self.seq, data
+
+
+class PubSubHub:
+    """
+    Shared Redis pub/sub listener for one worker process.
+    Subscribes to every poll channel once and fans each message out to the
+    WebSockets connected to this worker and the HTTP requests waiting here,
+    so the number of Redis connections stays constant no matter how many
+    viewers are attached.
+    """
+    def __init__(self, redis_url: str, pattern: str = "poll_*", reconnect_delay: float = 1.0):
+        self.redis_url = redis_url
+        self.pattern = pattern
+        self.reconnect_delay = reconnect_delay
+        self.connections: Dict[str, Set[Subscriber]] = {}
+        # Last broadcast per poll, the base for delta frames; only kept
+        # while the poll has delta subscribers here
+        self.states: Dict[str, PollState] = {}
+        self.listeners: Dict[str, Set[Listener]] = {}
+        self.handlers: Dict[str, Callable[[str], None]] = {}
+        self._redis = None
+        self._task = None
+
+    async def start(self):
+        self._redis = redis_async.from_url(self.redis_url, decode_responses=True)
+        self._task = asyncio.create_task(self._listen())
+        logger.info(f"Pub/sub hub listening on {self.pattern}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis:
+            await self._redis.close()
+            self._redis = None
+
+    def on_channel(self, channel: str, handler: Callable[[str], None]):
+        """Call handler(data) for every message on an extra, non-poll channel"""
+        self.handlers[channel] = handler
+
+    def register(self, poll_key: str, sub: Subscriber):
+        conns = self.connections.setdefault(poll_key, set())
+        if sub not in conns:
+            conns.add(sub)
+            # The gauge counts sockets, not subscriptions
+            if not sub.polls:
+                WS_CONNECTIONS.inc()
+            sub.polls.add(poll_key)
+
+    def unregister(self, poll_key: str, sub: Subscriber):
+        conns = self.connections.get(poll_key)
+        if conns is None or sub not in conns:
+            return
+        conns.discard(sub)
+        sub.polls.discard(poll_key)
+        sub.synced.pop(poll_key, None)
+        sub.discard(poll_key)
+        if not sub.polls:
+            WS_CONNECTIONS.dec()
+        if not conns:
+            del self.connections[poll_key]
+            self.states.pop(poll_key, None)
+
+    def listen(self, poll_key: str, listener: Listener):
+        self.listeners.setdefault(poll_key, set()).add(listener)
+
+    def unlisten(self, poll_key: str, listener: Listener):
+        listeners = self.listeners.get(poll_key)
+        if listeners is None:
+            return
+        listeners.discard(listener)
+        if not listeners:
+            del self.listeners[poll_key]
+
+    def send_snapshot(self, poll_key: str, sub: Subscriber, seq: int, results: Dict[str, int]):
+        """
+        Queue the current results for a new subscription, in the subscriber's
+        protocol. A subscriber that a broadcast already reached gets nothing.
+        """
+        if sub.protocol == JSON:
+            sub.push(poll_key, broadcast_message(int(poll_key), seq, results))
+            return
+        if sub.synced.get(poll_key, -1) >= seq:
+            return
+        sub.synced[poll_key] = seq
+        state = PollState(seq, list(results), list(results.values()))
+        # Counts and seq were read together, so this is a valid delta base
+        prev = self.states.get(poll_key)
+        if prev is None or prev.seq < seq:
+            self.states[poll_key] = state
+        sub.push(poll_key, snapshot_frame(int(poll_key), state))
+
+    async def _listen(self):
+        prefix_len = len(self.pattern.rstrip("*"))
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(self.pattern)
+                if self.handlers:
+                    await pubsub.subscribe(*self.handlers)
+                async for msg in pubsub.listen():
+                    if msg["type"] == "message":
+                        self._dispatch(msg["channel"], msg["data"])
+                    elif msg["type"] == "pmessage":
+                        self._fan_out(msg["channel"][prefix_len:], msg["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pub/sub hub error, reconnecting: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    def _dispatch(self, channel: str, data: str):
+        handler = self.handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            handler(data)
+        except Exception as e:
+            logger.error(f"Pub/sub handler error on {channel}: {e}")
+
+    def _frames(self, poll_key: str, data: str, conns: Set[Subscriber]):
+        """
+        (subscriber, frame) for every subscriber that should get this
+        broadcast. Delta and snapshot frames are encoded once and shared.
+        A delta only applies on top of the frame before it, so one replacing
+        a frame still queued becomes a snapshot.
+        """
+        if not any(sub.protocol == DELTA for sub in conns):
+            self.states.pop(poll_key, None)
+            return [(sub, data) for sub in conns]
+        state = PollState.from_message(data)
+        prev = self.states.get(poll_key)
+        if prev is not None and prev.seq >= state.seq:
+            # Overtaken by a newer broadcast; delta subscribers only move forward
+            return [(sub, data) for sub in conns if sub.protocol == JSON]
+        self.states[poll_key] = state
+        delta = delta_frame(int(poll_key), prev, state) if prev is not None else None
+        snapshot: Optional[str] = None
+
+        frames = []
+        for sub in conns:
+            if sub.protocol == JSON:
+                frames.append((sub, data))
+                continue
+            synced = sub.synced.get(poll_key)
+            if synced is not None and synced >= state.seq:
+                continue
+            sub.synced[poll_key] = state.seq
+            if delta is not None and synced == prev.seq and poll_key not in sub.pending:
+                frames.append((sub, delta))
+            else:
+                snapshot = snapshot or snapshot_frame(int(poll_key), state)
+                frames.append((sub, snapshot))
+        return frames
+
+    def _fan_out(self, poll_key: str, data: str):
+        listeners = self.listeners.get(poll_key)
+        if listeners:
+            seq = frame_seq(data)
+            for listener in listeners:
+                listener.put(seq, data)
+        conns = self.connections.get(poll_key)
+        if not conns:
+            return
+        start = time.perf_counter()
+        for sub, frame in self._frames(poll_key, data, conns):
+            sub.push(poll_key, frame)
+        WS_FANOUT.observe(time.perf_counter() - start)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Keep vote counters consistent:
+  rebuild  - recompute polloptioncount from the raw vote rows and reload
+             the Redis results hashes, site-wide stats counters and poll
+             timelines (default)
+  warm     - load missing Redis results hashes, stats counters and timelines
+  drift    - compare Redis results hashes with polloptioncount and repair
+             the ones that stay wrong (use --interval to run periodically)
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+import redis as redis_py
+from sqlmodel import Session, create_engine, select
+from sqlalchemy import func
+
+from models import PollOptionCount
+from vote_store import (
+    RESULTS_LOADED, rebuild_counts, results_key, counts_query, group_counts,
+    queue_results_load, queue_version_bumps
+)
+from stats_store import STATS_LOADED, queue_stats_load, stats_snapshot_queries
+from timeline_store import TIMELINE_LOADED, queue_timeline_load, timeline_snapshot_queries
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:pass@db:5432/votes")
+REDIS_URL    = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+engine = create_engine(DATABASE_URL)
+redis_client = redis_py.from_url(REDIS_URL, decode_responses=True)
+
+
+def reconcile():
+    """Recompute polloptioncount, then reload every results hash from it"""
+    with Session(engine) as session:
+        rebuild_counts(session)
+        rows, votes = session.exec(
+            select(func.count(), func.coalesce(func.sum(PollOptionCount.count), 0))
+        ).one()
+        grouped = group_counts(session.exec(counts_query()).all())
+    logger.info(f"✓ Rebuilt {rows} option counters covering {votes} votes")
+
+    pipe = redis_client.pipeline()
+    for poll_id, options in grouped.items():
+        queue_results_load(pipe, poll_id, options)
+    queue_version_bumps(pipe, grouped)
+    pipe.execute()
+    logger.info(f"✓ Reloaded {len(grouped)} results hashes")
+    load_stats()
+    load_timelines()
+
+
+def load_stats():
+    """Overwrite the /stats and /metrics counters from a database snapshot"""
+    queries = stats_snapshot_queries()
+    with Session(engine) as session:
+        totals = session.exec(queries["totals"]).one()
+        voted_polls = session.exec(queries["voted_polls"]).all()
+        minutes = session.exec(queries["minutes"]).all()
+    pipe = redis_client.pipeline()
+    queue_stats_load(pipe, totals, voted_polls, minutes)
+    pipe.execute()
+    logger.info(f"✓ Reloaded stats counters ({totals[0]} polls, {totals[2]} votes)")
+
+
+def load_timelines():
+    """Overwrite the timeline buckets of every resolution from a database snapshot"""
+    for name, query in timeline_snapshot_queries().items():
+        with Session(engine) as session:
+            rows = session.exec(query).all()
+        pipe = redis_client.pipeline()
+        queue_timeline_load(pipe, name, rows)
+        pipe.execute()
+        logger.info(f"✓ Reloaded {len(rows)} {name} timeline buckets")
+    redis_client.set(TIMELINE_LOADED, 1)
+
+
+def read_hashes(poll_ids):
+    pipe = redis_client.pipeline(transaction=False)
+    for poll_id in poll_ids:
+        pipe.hgetall(results_key(poll_id))
+    return dict(zip(poll_ids, pipe.execute(raise_on_error=False)))
+
+
+def warm():
+    """Cold-start loader: fill every results hash that isn't loaded yet"""
+    with Session(engine) as session:
+        grouped = group_counts(session.exec(counts_query()).all())
+    hashes = read_hashes(list(grouped))
+
+    pipe = redis_client.pipeline()
+    loaded = 0
+    for poll_id, options in grouped.items():
+        raw = hashes[poll_id]
+        if isinstance(raw, dict) and raw.get(RESULTS_LOADED):
+            continue
+        queue_results_load(pipe, poll_id, options)
+        loaded += 1
+    pipe.execute()
+    logger.info(f"✓ Loaded {loaded} of {len(grouped)} results hashes")
+    if not redis_client.exists(STATS_LOADED):
+        load_stats()
+    if not redis_client.exists(TIMELINE_LOADED):
+        load_timelines()
+
+
+def find_drift():
+    """poll_id -> (hash snapshot, database counts) for loaded hashes that disagree"""
+    with Session(engine) as session:
+        grouped = group_counts(session.exec(counts_query()).all())
+    hashes = read_hashes(list(grouped))
+
+    drifted = {}
+    for poll_id, options in grouped.items():
+        raw = hashes[poll_id]
+        if not isinstance(raw, dict) or not raw.get(RESULTS_LOADED):
+            continue
+        expected = {str(option_id): count for option_id, _, count in options}
+        actual = {field: int(value) for field, value in raw.items() if field != RESULTS_LOADED}
+        if any(actual.get(field, 0) != count for field, count in expected.items()):
+            drifted[poll_id] = (actual, options)
+    return drifted
+
+
+def check_drift(settle: float = 1.0):
+    """
+    Repair hashes that disagree with Postgres. A vote sits between its commit
+    and its HINCRBY for a moment, so a poll is only rewritten when the same
+    mismatch is still there, with an unchanged hash, after `settle` seconds.
+    """
+    first = find_drift()
+    if not first:
+        logger.info("✓ No drift between Redis and Postgres counters")
+        return 0
+    time.sleep(settle)
+    second = find_drift()
+
+    pipe = redis_client.pipeline()
+    repaired = 0
+    for poll_id, (actual, options) in second.items():
+        if poll_id not in first or first[poll_id][0] != actual:
+            continue
+        logger.warning(f"Repairing drifted results hash for poll {poll_id}")
+        queue_results_load(pipe, poll_id, options)
+        queue_version_bumps(pipe, [poll_id])
+        repaired += 1
+    pipe.execute()
+    logger.info(f"✓ Repaired {repaired} drifted results hashes")
+    return repaired
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vote counter maintenance")
+    parser.add_argument("command", nargs="?", default="rebuild", choices=["rebuild", "warm", "drift"])
+    parser.add_argument("--interval", type=float, default=0,
+                        help="with drift: repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "rebuild":
+            reconcile()
+        elif args.command == "warm":
+            warm()
+        else:
+            while True:
+                # The API answers 503 for timelines until someone reloads them
+                if not redis_client.exists(TIMELINE_LOADED):
+                    load_timelines()
+                check_drift()
+                if not args.interval:
+                    break
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"❌ Reconciliation error: {e}")
+        sys.exit(1)
@@ -3,165 +3,214 @@
 from sqlmodel import SQLModel, Session, select, create_engine
 import datetime
 import os
+import io
+import time
 import logging
 import random
 import json
+import argparse
+import redis as redis_py
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from sqlalchemy import func, insert, text
 from models import Poll, Option, Vote
+from vote_store import VERSION_EPOCH, rebuild_counts
+from stats_store import STATS_LOADED
+from timeline_store import TIMELINE_LOADED
+from poll_store import (
+    link_insert, link_rows, option_insert, option_rows, poll_insert, poll_rows, queue_poll_invalidation
+)
+from themes import DEFAULT_THEMES, themes_upsert, theme_counts_refresh
+from partitions import ensure_vote_partitions
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Use environment variables or default values for the connection
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:pass@db:5432/votes")
+REDIS_URL    = os.getenv("REDIS_URL", "redis://redis:6379/0")
 engine = create_engine(DATABASE_URL)
 
-def init_db():
-    """Initialize the database by creating all tables"""
+# Every table that holds poll data, in one TRUNCATE-able list
+POLL_TABLES = ["poll", "option", "polloption", "polloptioncount", "vote", "voterollup"]
+
+def init_db(history_days: int = 7):
+    """Initialize the database by creating all tables and the vote partitions seeding needs"""
     logging.info("Initializing database tables")
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        today = datetime.datetime.utcnow().date()
+        ensure_vote_partitions(conn, start=today - datetime.timedelta(days=history_days))
+
+def insert_polls(session, polls):
+    """
+    Insert (question, theme, [option texts]) polls with three statements and
+    return (poll_id, [option_ids]) pairs; the caller commits
+    """
+    poll_ids = session.execute(poll_insert(), poll_rows(polls)).scalars().all()
+    option_ids = session.execute(option_insert(), option_rows(polls)).scalars().all()
+    session.execute(link_insert(), link_rows(polls, poll_ids, option_ids))
+    created, offset = [], 0
+    for (_, _, texts), poll_id in zip(polls, poll_ids):
+        created.append((poll_id, option_ids[offset:offset + len(texts)]))
+        offset += len(texts)
+    return created
 
 def seed():
     """Seed the database with themed polls, clearing existing ones first"""
-    # Organized themes and polls
+    # Polls per theme; theme metadata lives in themes.DEFAULT_THEMES
     themes = {
-        "OnTrend": {
-            "name": "#OnTrend",
-            "slug": "on-trend", 
-            "description": "The hottest topics of the moment. From technology and social media to the latest releases everyone's talking about. Vote and discover if you think like the majority!",
-            "polls": [
-                (
-                    "What will be the next 'big social network' to dominate the market?",
-                    ["A generative AI app", "A decentralized micro-video platform", "The resurgence of niche forums", "None, the market is saturated"]
-                ),
-                (
-                    "Looking at the future of work, what's your ideal model?",
-                    ["100% Remote, with total freedom", "Flexible hybrid (go to office when I want)", "Structured hybrid (fixed office days)", "100% In-person, the office is key"]
-                ),
-                (
-                    "With so many cinematic universes, what do you prefer for the future of superhero movies?",
-                    ["Complete reboots with new actors", "Smaller, more personal stories", "Fewer movies, but higher quality", "More massive crossovers between franchises!"]
-                )
-            ]
-        },
-        "MoralDilemmas": {
-            "name": "Moral Dilemmas",
-            "slug": "moral-dilemmas",
-            "description": "Difficult questions with no right answer. Test your principles and discover how the world would react to these extreme situations.",
-            "polls": [
-                (
-                    "An autonomous car with no brakes is about to hit 5 pedestrians. You can divert the car to hit only its single passenger. What should the car do?",
-                    ["Save the 5 pedestrians", "Save the passenger", "The decision should be random", "It's impossible to program that morality"]
-                ),
-                (
-                    "Would you give up part of your online privacy to ensure greater public safety and prevent serious crimes?",
-                    ["Yes, security is a priority", "Only under strict judicial supervision", "No, privacy is an unbreakable right", "I'm not sure"]
-                ),
-                (
-                    "If you could know a painful truth about your future, would you rather know it or live happily in ignorance?",
-                    ["I want to know the truth, no matter the cost", "I prefer the happiness of ignorance", "It would depend on the type of truth", "Only if I can do something to change it"]
-                )
-            ]
-        },
-        "Sports": {
-            "name": "⚽ Sports",
-            "slug": "sports",
-            "description": "The boldest predictions from the world of sports. Will you nail your forecasts?",
-            "polls": [
-                (
-                    "Will Spain win the next World Cup?",
-                    ["Yes", "No"]
-                ),
-                (
-                    "Next winner of La Liga?",
-                    ["Real Madrid", "FC Barcelona", "Atlético Madrid", "Another team"]
-                ),
-                (
-                    "Next Ballon d'Or winner?",
-                    ["Lamine Yamal", "Kylian Mbappé", "Ousmane Dembélé", "Another player"]
-                )
-            ]
-        }
+        "OnTrend": [
+            (
+                "What will be the next 'big social network' to dominate the market?",
+                ["A generative AI app", "A decentralized micro-video platform", "The resurgence of niche forums", "None, the market is saturated"]
+            ),
+            (
+                "Looking at the future of work, what's your ideal model?",
+                ["100% Remote, with total freedom", "Flexible hybrid (go to office when I want)", "Structured hybrid (fixed office days)", "100% In-person, the office is key"]
+            ),
+            (
+                "With so many cinematic universes, what do you prefer for the future of superhero movies?",
+                ["Complete reboots with new actors", "Smaller, more personal stories", "Fewer movies, but higher quality", "More massive crossovers between franchises!"]
+            )
+        ],
+        "MoralDilemmas": [
+            (
+                "An autonomous car with no brakes is about to hit 5 pedestrians. You can divert the car to hit only its single passenger. What should the car do?",
+                ["Save the 5 pedestrians", "Save the passenger", "The decision should be random", "It's impossible to program that morality"]
+            ),
+            (
+                "Would you give up part of your online privacy to ensure greater public safety and prevent serious crimes?",
+                ["Yes, security is a priority", "Only under strict judicial supervision", "No, privacy is an unbreakable right", "I'm not sure"]
+            ),
+            (
+                "If you could know a painful truth about your future, would you rather know it or live happily in ignorance?",
+                ["I want to know the truth, no matter the cost", "I prefer the happiness of ignorance", "It would depend on the type of truth", "Only if I can do something to change it"]
+            )
+        ],
+        "Sports": [
+            (
+                "Will Spain win the next World Cup?",
+                ["Yes", "No"]
+            ),
+            (
+                "Next winner of La Liga?",
+                ["Real Madrid", "FC Barcelona", "Atlético Madrid", "Another team"]
+            ),
+            (
+                "Next Ballon d'Or winner?",
+                ["Lamine Yamal", "Kylian Mbappé", "Ousmane Dembélé", "Another player"]
+            )
+        ]
     }
     
     with Session(engine) as session:
         # Clear existing polls
         logging.info("Clearing all existing polls...")
-        existing_polls = session.exec(select(Poll)).all()
-        for poll in existing_polls:
-            session.delete(poll)
-        session.commit()
-        logging.info(f"Cleared {len(existing_polls)} existing polls")
+        cleared = truncate_polls(session)
+        logging.info(f"Cleared {cleared} existing polls")
         
         # Create new polls by theme
-        for theme_key, theme_data in themes.items():
-            logging.info(f"Creating polls for theme: {theme_data['name']}")
-            
-            for question, opts in theme_data["polls"]:
-                # Create new poll
-                logging.info(f"Creating poll: {question}")
-                p = Poll(
-                    question=question,
-                    theme=theme_key,  # Assign theme
-                    created_at=datetime.datetime.utcnow(),
-                )
-                # Add options
-                p.options = [Option(text=o) for o in opts]
-                session.add(p)
-
-        session.commit()
+        session.exec(themes_upsert())
+        polls = []
+        for theme_key, theme_polls in themes.items():
+            logging.info(f"Creating polls for theme: {DEFAULT_THEMES[theme_key]['name']}")
+            polls.extend((question, theme_key, opts) for question, opts in theme_polls)
+        created = insert_polls(session, polls)
+        session.exec(theme_counts_refresh())
         
         # Generate random votes so there are statistics from the beginning
         logging.info("Generating random votes for statistics...")
-        polls = session.exec(select(Poll)).all()
-        
-        for poll in polls:
+        now = datetime.datetime.utcnow()
+        votes = []
+        for poll_id, option_ids in created:
             # Generate between 50 and 200 random votes per poll
-            num_votes = random.randint(50, 200)
-            
-            for _ in range(num_votes):
-                # Select random option
-                random_option = random.choice(poll.options)
-                
-                # Create vote
-                vote = Vote(
-                    poll_id=poll.id,
-                    option_id=random_option.id,
-                    user_id=random.randint(1000, 9999),  # Fictitious user ID
-                    voted_at=datetime.datetime.utcnow() - datetime.timedelta(
+            for _ in range(random.randint(50, 200)):
+                votes.append({
+                    "poll_id": poll_id,
+                    "option_id": random.choice(option_ids),
+                    "user_id": random.randint(1000, 9999),  # Fictitious user ID
+                    "voted_at": now - datetime.timedelta(
                         minutes=random.randint(0, 60*24*7)  # Votes in the last week
                     )
-                )
-                session.add(vote)
-        
+                })
+        session.execute(insert(Vote), votes)
         session.commit()
+        
+        # Votes were inserted without touching the counters; derive them in one pass
+        rebuild_counts(session)
         logging.info("All themed polls created successfully with random votes")
+    reset_redis()
+
+def delete_matching(redis_client, pattern: str, batch: int = 1000) -> int:
+    """UNLINK every key matching `pattern`, `batch` keys per call"""
+    keys, deleted = [], 0
+    for key in redis_client.scan_iter(match=pattern, count=batch):
+        keys.append(key)
+        if len(keys) >= batch:
+            deleted += redis_client.unlink(*keys)
+            keys = []
+    if keys:
+        deleted += redis_client.unlink(*keys)
+    return deleted
+
+# Per-poll Redis keys. `--scale` restarts the ids at 1, so anything left
+# under an old id would be read as the new poll's.
+POLL_KEY_PATTERNS = ["poll:*", "results:*", "timeline:*", "version:poll:*",
+                     "broadcast:seq:*", "broadcast:pending:*"]
+
+def reset_redis():
+    """
+    Forget the old polls after replacing them: drop every per-poll key (the
+    timeline marker with them) and the stats marker, so `reconcile_counts.py
+    warm` (or the first request) reloads them from the new data; drop the
+    definitions every app worker holds; start a new ETag epoch, as the
+    version counters restart too.
+    """
+    redis_client = redis_py.from_url(REDIS_URL)
+    try:
+        deleted = sum(delete_matching(redis_client, pattern) for pattern in POLL_KEY_PATTERNS)
+        redis_client.delete(STATS_LOADED, TIMELINE_LOADED, VERSION_EPOCH)
+        pipe = redis_client.pipeline()
+        queue_poll_invalidation(pipe)
+        pipe.execute()
+        logging.info(f"Dropped {deleted} per-poll keys from Redis")
+    finally:
+        redis_client.close()
+
+def truncate_polls(session) -> int:
+    """
+    Empty every poll table, votes included, and return how many polls there
+    were. Deleting through the ORM would load and orphan each vote row, which
+    takes hours after a --scale load.
+    """
+    count = session.exec(select(func.count(Poll.id))).one()
+    session.exec(text(f"TRUNCATE {', '.join(POLL_TABLES)}"))
+    session.commit()
+    return count
 
 def clear_polls():
     """Remove all polls from the database"""
     with Session(engine) as session:
-        polls = session.exec(select(Poll)).all()
-        for poll in polls:
-            session.delete(poll)
+        cleared = truncate_polls(session)
+        session.exec(theme_counts_refresh())
         session.commit()
-        logging.info(f"Removed {len(polls)} polls from database")
+        logging.info(f"Removed {cleared} polls from database")
+    reset_redis()
 
 def generate_random_polls(count=5):
     """Generate random polls for testing purposes"""
     topics = ["Economy", "Environment", "Politics", "Education", "Health", "Technology"]
     
+    polls = []
+    for i in range(count):
+        topic = random.choice(topics)
+        question = f"Random question about {topic} #{i+1}?"
+        options = [f"Option {j+1}" for j in range(random.randint(2, 5))]
+        polls.append((question, None, options))
+    
     with Session(engine) as session:
-        for i in range(count):
-            topic = random.choice(topics)
-            question = f"Random question about {topic} #{i+1}?"
-            options = [f"Option {j+1}" for j in range(random.randint(2, 5))]
-            
-            p = Poll(
-                question=question,
-                created_at=datetime.datetime.utcnow(),
-            )
-            p.options = [Option(text=o) for o in options]
-            session.add(p)
-            
+        insert_polls(session, polls)
         session.commit()
         logging.info(f"Generated {count} random polls")
 
@@ -216,6 +265,215 @@ def import_polls(filename="polls_backup.json"):
     except json.JSONDecodeError:
         logging.error(f"Invalid JSON in file: {filename}")
 
+# --scale: synthetic data in the shape production has, loaded with COPY.
+# Rows are generated in Python and streamed to Postgres by --jobs processes.
+# Secondary indexes and foreign keys on the loaded tables are dropped first
+# and rebuilt once at the end, which is far cheaper than maintaining them
+# row by row.
+SCALE_USERS = 1_000_000
+
+
+def copy_rows(cursor, table: str, columns: list, lines: list):
+    """COPY tab-separated text lines into `table`"""
+    buf = io.StringIO("\n".join(lines) + "\n")
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+
+def zipf_cum_weights(n: int, s: float) -> list:
+    """Cumulative weights of ranks 1..n under Zipf(s), for random.choices"""
+    total, cum = 0.0, []
+    for rank in range(1, n + 1):
+        total += rank ** -s
+        cum.append(total)
+    return cum
+
+
+@contextmanager
+def deferred_indexes(conn, tables: list):
+    """
+    Drop the indexes, primary keys and foreign keys of `tables`, and recreate
+    them from their saved definitions on exit, even if the load failed.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT i.indexname, i.indexdef FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        """,
+        (tables,)
+    )
+    indexes = cursor.fetchall()
+    # Foreign keys last, so they are dropped before and added after the keys they point at
+    cursor.execute(
+        """
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype IN ('p', 'u', 'f') AND connamespace = current_schema()::regnamespace
+          AND conrelid::regclass::text = ANY(%s)
+        ORDER BY contype = 'f'
+        """,
+        (tables,)
+    )
+    constraints = cursor.fetchall()
+    for table, name, _ in reversed(constraints):
+        cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX "{name}"')
+    conn.commit()
+    logging.info(f"Deferred {len(indexes)} indexes and {len(constraints)} constraints")
+    try:
+        yield
+    finally:
+        conn.rollback()
+        cursor.execute("SET maintenance_work_mem = '512MB'")
+        for name, definition in indexes:
+            start = time.monotonic()
+            # Partitioned parents report ON ONLY, which would skip the partitions
+            cursor.execute(definition.replace(" ON ONLY ", " ON ", 1))
+            conn.commit()
+            logging.info(f"Built {name} in {time.monotonic() - start:.1f}s")
+        for table, name, definition in constraints:
+            start = time.monotonic()
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+            conn.commit()
+            logging.info(f"Added {name} in {time.monotonic() - start:.1f}s")
+
+
+def load_scale_polls(cursor, polls: int, options: int, now: datetime.datetime, days: int):
+    """Polls 1..polls with ids assigned here, so votes can be generated without a lookup"""
+    theme_keys = list(DEFAULT_THEMES)
+    start = now - datetime.timedelta(days=days)
+    for first in range(1, polls + 1, 10000):
+        ids = range(first, min(first + 10000, polls + 1))
+        copy_rows(cursor, "poll", ["id", "question", "theme", "created_at", "is_active"], [
+            f"{i}\tSynthetic poll #{i}?\t{theme_keys[i % len(theme_keys)]}\t{start:%Y-%m-%d %H:%M:%S}\tt"
+            for i in ids
+        ])
+        copy_rows(cursor, "option", ["id", "text", "created_at"], [
+            f"{(i - 1) * options + j + 1}\tOption {j + 1}\t{start:%Y-%m-%d %H:%M:%S}"
+            for i in ids for j in range(options)
+        ])
+        copy_rows(cursor, "polloption", ["poll_id", "option_id"], [
+            f"{i}\t{(i - 1) * options + j + 1}" for i in ids for j in range(options)
+        ])
+    # Ids were given explicitly; move the sequences past them
+    cursor.execute("SELECT setval(pg_get_serial_sequence('poll', 'id'), %s)", (polls,))
+    cursor.execute("SELECT setval(pg_get_serial_sequence('option', 'id'), %s)", (polls * options,))
+
+
+def load_scale_votes(job: int, votes: int, polls: int, options: int, skew: float,
+                     now_epoch: int, days: int, chunk: int, seed: int) -> int:
+    """
+    One loader process: `votes` rows, Zipf(skew) over polls (hot polls are
+    scattered over the id range) and over each poll's options, voted_at
+    weighted towards the recent end of the window.
+    """
+    rng = random.Random(seed * 1000 + job)
+    # Same permutation in every job: rank r is always the same poll
+    poll_ids = list(range(1, polls + 1))
+    random.Random(seed).shuffle(poll_ids)
+    poll_cum = zipf_cum_weights(polls, skew)
+    option_cum = zipf_cum_weights(options, skew)
+    option_offsets = list(range(options))
+    span = days * 86400
+    first_minute = (now_epoch - span) // 60
+    minute_text = [
+        time.strftime("%Y-%m-%d %H:%M", time.gmtime(m * 60))
+        for m in range(first_minute, now_epoch // 60 + 1)
+    ]
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET synchronous_commit = off")
+        done = 0
+        while done < votes:
+            n = min(chunk, votes - done)
+            picked = rng.choices(poll_ids, cum_weights=poll_cum, k=n)
+            offsets = rng.choices(option_offsets, cum_weights=option_cum, k=n)
+            lines = []
+            for poll_id, offset in zip(picked, offsets):
+                t = now_epoch - int(rng.triangular(0, span, 0))
+                lines.append(
+                    f"{poll_id}\t{(poll_id - 1) * options + offset + 1}\t"
+                    f"{rng.randrange(1, SCALE_USERS)}\t{minute_text[t // 60 - first_minute]}:{t % 60:02d}"
+                )
+            copy_rows(cursor, "vote", ["poll_id", "option_id", "user_id", "voted_at"], lines)
+            conn.commit()
+            done += n
+        return done
+    finally:
+        conn.close()
+
+
+def _dispose_engine():
+    # Forked loaders must not share the parent's pooled connections
+    engine.dispose(close=False)
+
+
+def seed_scale(polls: int, options: int, votes: int, skew: float = 1.1, days: int = 30,
+               chunk: int = 200000, jobs: int = 4, seed: int = 42):
+    """Replace every poll with a synthetic dataset of `polls` x `options` and `votes` votes"""
+    started = time.monotonic()
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        logging.info("Clearing all existing polls and votes...")
+        cursor.execute(f"TRUNCATE {', '.join(POLL_TABLES)} RESTART IDENTITY")
+        conn.commit()
+
+        with deferred_indexes(conn, POLL_TABLES):
+            load_scale_polls(cursor, polls, options, now, days)
+            conn.commit()
+            logging.info(f"Loaded {polls} polls with {options} options each")
+
+            per_job = [votes // jobs + (1 if j < votes % jobs else 0) for j in range(jobs)]
+            now_epoch = int(now.replace(tzinfo=datetime.timezone.utc).timestamp())
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_dispose_engine) as pool:
+                loaded = sum(pool.map(
+                    load_scale_votes, range(jobs), per_job, [polls] * jobs, [options] * jobs,
+                    [skew] * jobs, [now_epoch] * jobs, [days] * jobs, [chunk] * jobs, [seed] * jobs
+                ))
+            elapsed = time.monotonic() - started
+            logging.info(f"Loaded {loaded} votes in {elapsed:.0f}s ({loaded / max(elapsed, 1e-3):,.0f}/s)")
+    finally:
+        conn.close()
+
+    with Session(engine) as session:
+        session.exec(themes_upsert())
+        session.exec(theme_counts_refresh())
+        session.commit()
+        rebuild_counts(session)
+    reset_redis()
+
+    # Fresh statistics, or the planner works from an empty table's estimates
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text(f"ANALYZE {', '.join(POLL_TABLES)}")
+        )
+    logging.info(f"Synthetic dataset ready in {time.monotonic() - started:.0f}s; "
+                 "run `python reconcile_counts.py warm` to reload Redis")
+
 if __name__ == "__main__":
-    init_db()
-    seed()
+    parser = argparse.ArgumentParser(description="Seed the poll database")
+    parser.add_argument("--scale", action="store_true",
+                        help="generate a large synthetic dataset instead of the themed demo polls")
+    parser.add_argument("--polls", type=int, default=10000)
+    parser.add_argument("--options", type=int, default=4, help="options per poll")
+    parser.add_argument("--votes", type=int, default=1000000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for poll popularity")
+    parser.add_argument("--days", type=int, default=30, help="spread votes over the last N days")
+    parser.add_argument("--chunk", type=int, default=200000, help="rows per COPY")
+    parser.add_argument("--jobs", type=int, default=min(4, os.cpu_count() or 1),
+                        help="parallel vote loaders")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    args = parser.parse_args()
+
+    init_db(history_days=args.days if args.scale else 7)
+    if args.scale:
+        seed_scale(args.polls, args.options, args.votes, args.skew, args.days,
+                   args.chunk, args.jobs, args.seed)
+    else:
+        seed()
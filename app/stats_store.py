@@ -0,0 +1,128 @@
+# app/stats_store.py
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from models import Poll, PollOptionLink, PollOptionCount, Vote
+
+# Site-wide figures for /stats and /metrics, kept as Redis counters so the
+# endpoints never scan the vote table. Totals have no TTL; votes per minute
+# live in small buckets that expire once they fall out of the 24h window.
+TOTAL_POLLS = "stats:total_polls"
+TOTAL_OPTIONS = "stats:total_options"
+TOTAL_VOTES = "stats:total_votes"
+VOTED_POLLS = "stats:voted_polls"  # set of poll ids with at least one vote
+STATS_LOADED = "stats:loaded"
+
+RECENT_MINUTES = 24 * 60
+BUCKET_TTL = 25 * 3600
+
+
+def minute_of(ts: datetime) -> int:
+    """Minutes since the epoch for a naive UTC timestamp"""
+    return int(ts.replace(tzinfo=timezone.utc).timestamp() // 60)
+
+
+def minute_key(minute: int) -> str:
+    return f"stats:votes:m:{minute}"
+
+
+def recent_minute_keys(now: Optional[datetime] = None, minutes: int = RECENT_MINUTES) -> List[str]:
+    """Bucket keys of the last `minutes` minutes, current minute included"""
+    last = minute_of(now or datetime.utcnow())
+    return [minute_key(m) for m in range(last - minutes + 1, last + 1)]
+
+
+def queue_vote_stats(pipe, rows: List[dict]):
+    """Queue the counter updates for a batch of stored votes"""
+    pipe.incrby(TOTAL_VOTES, len(rows))
+    pipe.sadd(VOTED_POLLS, *{row["poll_id"] for row in rows})
+    for minute, n in Counter(minute_of(row["voted_at"]) for row in rows).items():
+        pipe.incrby(minute_key(minute), n)
+        pipe.expire(minute_key(minute), BUCKET_TTL)
+
+
+def queue_poll_stats(pipe, option_count: int, polls: int = 1):
+    """Queue the counter updates for newly created polls"""
+    pipe.incrby(TOTAL_POLLS, polls)
+    pipe.incrby(TOTAL_OPTIONS, option_count)
+
+
+def stats_snapshot_queries() -> Dict[str, object]:
+    """
+    Statements that read everything queue_stats_load() needs. These are the
+    scans the counters replace, so they only run to (re)build them.
+    """
+    since = datetime.utcnow() - timedelta(minutes=RECENT_MINUTES)
+    return {
+        "totals": select(
+            select(func.count(Poll.id)).scalar_subquery(),
+            select(func.count(PollOptionLink.option_id)).scalar_subquery(),
+            select(func.coalesce(func.sum(PollOptionCount.count), 0)).scalar_subquery(),
+        ),
+        "voted_polls": (
+            select(PollOptionCount.poll_id)
+            .where(PollOptionCount.count > 0)
+            .distinct()
+        ),
+        "minutes": (
+            select(
+                func.floor(func.extract("epoch", Vote.voted_at) / 60).label("minute"),
+                func.count(Vote.id)
+            )
+            .where(Vote.voted_at >= since, Vote.poll_id.is_not(None))
+            .group_by("minute")
+        ),
+    }
+
+
+def queue_stats_load(pipe, totals: Iterable[int], voted_polls: Iterable[int],
+                     minutes: Iterable[tuple]):
+    """Queue a full overwrite of the counters from a database snapshot"""
+    total_polls, total_options, total_votes = totals
+    pipe.set(TOTAL_POLLS, int(total_polls))
+    pipe.set(TOTAL_OPTIONS, int(total_options))
+    pipe.set(TOTAL_VOTES, int(total_votes))
+    pipe.delete(VOTED_POLLS)
+    voted = list(voted_polls)
+    if voted:
+        pipe.sadd(VOTED_POLLS, *voted)
+    # Buckets the snapshot has no votes for must read as zero too
+    pipe.delete(*recent_minute_keys())
+    for minute, n in minutes:
+        pipe.set(minute_key(int(minute)), int(n), ex=BUCKET_TTL)
+    pipe.set(STATS_LOADED, 1)
+
+
+def queue_stats_read(pipe, recent: bool = False, now: Optional[datetime] = None):
+    """
+    Queue the reads behind stats_from_replies(): the totals, plus the 24h
+    buckets only when `recent`, as they are 1440 keys
+    """
+    pipe.mget(STATS_LOADED, TOTAL_POLLS, TOTAL_OPTIONS, TOTAL_VOTES)
+    pipe.scard(VOTED_POLLS)
+    if recent:
+        pipe.mget(recent_minute_keys(now))
+
+
+def stats_from_replies(replies) -> Optional[Dict[str, int]]:
+    """
+    Counter values from queue_stats_read() replies, None until loaded;
+    recent_votes_24h is only there when the buckets were read
+    """
+    (loaded, total_polls, total_options, total_votes), voted_polls, *buckets = replies
+    if not loaded:
+        return None
+    stats = {
+        "total_polls": int(total_polls or 0),
+        "total_options": int(total_options or 0),
+        "total_votes": int(total_votes or 0),
+        "polls_with_votes": int(voted_polls),
+    }
+    if buckets:
+        stats["recent_votes_24h"] = sum(int(b) for b in buckets[0] if b)
+    return stats
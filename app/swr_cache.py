@@ -0,0 +1,168 @@
+# app/swr_cache.py
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Makes sure only one recompute per key runs at a time.
+    Inside a worker, concurrent callers await one shared Future; across
+    workers, a short Redis lock elects the process that recomputes while the
+    others wait for its result to show up (peek) before giving up and computing.
+    """
+    def __init__(self, redis_client, lock_ttl_ms: int = 10000,
+                 wait_timeout: float = 3.0, poll_interval: float = 0.05):
+        self.redis = redis_client
+        self.lock_ttl_ms = lock_ttl_ms
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._release = redis_client.register_script(RELEASE_LOCK)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, compute: Callable[[], Awaitable[Any]],
+                 peek: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            # shield: a cancelled follower must not cancel the leader's result
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await self._run(key, compute, peek)
+            fut.set_result(value)
+            return value
+        except BaseException as e:
+            fut.set_exception(e)
+            # Nobody may be waiting; don't log "exception never retrieved"
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def try_run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> bool:
+        """Recompute only if nobody else is doing it right now, never wait"""
+        if key in self._inflight:
+            return False
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            token = await self._acquire(key)
+            if token is None:
+                fut.set_result(None)
+                return False
+            try:
+                fut.set_result(await compute())
+            finally:
+                await self._release(keys=[f"lock:{key}"], args=[token])
+            return True
+        except BaseException as e:
+            if not fut.done():
+                fut.set_exception(e)
+                fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _acquire(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if await self.redis.set(f"lock:{key}", token, nx=True, px=self.lock_ttl_ms):
+            return token
+        return None
+
+    async def _run(self, key, compute, peek):
+        token = await self._acquire(key)
+        if token is not None:
+            try:
+                return await compute()
+            finally:
+                await self._release(keys=[f"lock:{key}"], args=[token])
+
+        # Another worker holds the lock: wait for its result
+        if peek is not None:
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                value = await peek()
+                if value is not None:
+                    return value
+        logger.warning(f"Timed out waiting for {key}, recomputing locally")
+        return await compute()
+
+
+class SWRCache:
+    """
+    Stale-while-revalidate JSON cache in Redis.
+    Entries are stored with the time they were computed. Past soft_ttl the
+    stale value is still returned while one background refresh runs; past
+    hard_ttl Redis has expired the entry and callers wait on a single-flight
+    recompute.
+    """
+    def __init__(self, redis_client, flight: SingleFlight):
+        self.redis = redis_client
+        self.flight = flight
+        # Keep references so running refreshes aren't garbage collected
+        self._refreshes: Set[asyncio.Task] = set()
+
+    async def get(self, key: str, compute: Callable[[], Awaitable[Any]],
+                  soft_ttl: float, hard_ttl: int) -> Any:
+        entry = await self._read(key)
+        if entry is not None:
+            if time.time() - entry["t"] >= soft_ttl and not self.flight.in_flight(key):
+                task = asyncio.create_task(self._refresh(key, compute, hard_ttl))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+            return entry["v"]
+
+        async def load():
+            return await self._store(key, await compute(), hard_ttl)
+
+        return await self.flight.do(key, load, peek=lambda: self._value(key))
+
+    async def _read(self, key: str) -> Optional[dict]:
+        raw = await self.redis.get(key)
+        if not raw:
+            return None
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return None
+        # Entries written before this cache existed have no timestamp
+        if not isinstance(entry, dict) or "t" not in entry or "v" not in entry:
+            return None
+        return entry
+
+    async def _value(self, key: str) -> Any:
+        entry = await self._read(key)
+        return entry["v"] if entry is not None else None
+
+    async def _store(self, key: str, value: Any, hard_ttl: int) -> Any:
+        await self.redis.set(key, json.dumps({"v": value, "t": time.time()}), ex=hard_ttl)
+        return value
+
+    async def _refresh(self, key: str, compute: Callable[[], Awaitable[Any]], hard_ttl: int):
+        async def load():
+            return await self._store(key, await compute(), hard_ttl)
+
+        try:
+            await self.flight.try_run(key, load)
+        except Exception as e:
+            logger.error(f"Background refresh of {key} failed: {e}")
@@ -0,0 +1,85 @@
+# app/themes.py
+
+from typing import Dict
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import Poll, Theme
+
+# Whole /themes payload, already serialized; dropped whenever a poll changes
+THEMES_KEY = "themes:all"
+THEMES_TTL = 300
+
+# Built-in themes, written to the theme table by seed_polls.py and
+# migrate_indices.py. Display order follows this dict.
+DEFAULT_THEMES: Dict[str, dict] = {
+    "OnTrend": {
+        "name": "#OnTrend",
+        "slug": "on-trend",
+        "description": "The hottest topics of the moment. From technology and social media to the releases everyone is talking about. Vote and discover if you think like the majority!",
+        "color": "#ff6b6b",
+        "icon": "🔥"
+    },
+    "MoralDilemmas": {
+        "name": "Moral Dilemmas",
+        "slug": "moral-dilemmas",
+        "description": "Difficult questions with no right answer. Test your principles and discover how the world would react to these extreme situations.",
+        "color": "#4ecdc4",
+        "icon": "🤔"
+    },
+    "Sports": {
+        "name": "⚽ Sports",
+        "slug": "sports",
+        "description": "The boldest predictions in the world of sports. Will you get your predictions right?",
+        "color": "#45b7d1",
+        "icon": "⚽"
+    }
+}
+
+
+def themes_upsert(themes: Dict[str, dict] = DEFAULT_THEMES):
+    """Insert or update theme metadata, leaving poll counters alone"""
+    values = [
+        dict(key=key, position=position, **meta)
+        for position, (key, meta) in enumerate(themes.items())
+    ]
+    stmt = pg_insert(Theme).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={col: stmt.excluded[col] for col in ("position", "name", "slug", "description", "color", "icon")}
+    )
+
+
+def theme_count_bump(theme: str, delta: int = 1):
+    """Keep a theme's poll_count in step with a poll insert; run it in the same transaction"""
+    return (
+        update(Theme)
+        .where(Theme.key == theme)
+        .values(poll_count=Theme.poll_count + delta)
+    )
+
+
+def theme_counts_refresh():
+    """Recompute every theme's poll_count from the poll table"""
+    counted = (
+        select(func.count(Poll.id))
+        .where(Poll.theme == Theme.key)
+        .scalar_subquery()
+    )
+    return update(Theme).values(poll_count=counted)
+
+
+def themes_payload(themes) -> Dict[str, dict]:
+    """/themes response body: theme key -> metadata and poll count, in display order"""
+    return {
+        t.key: {
+            "name": t.name,
+            "slug": t.slug,
+            "description": t.description,
+            "color": t.color,
+            "icon": t.icon,
+            "poll_count": t.poll_count
+        }
+        for t in themes
+    }
@@ -0,0 +1,137 @@
+# app/timeline_store.py
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, union_all
+from sqlmodel import select
+
+from models import Vote, VoteRollup
+
+# Votes over time per poll and option, for /polls/{id}/timeline. Every stored
+# vote bumps one bucket at each resolution; finer buckets expire sooner, so
+# older ranges are read from hours and then days. A Redis hash holds one
+# chunk of consecutive buckets of a poll, field "{bucket}:{option_id}", where
+# bucket = epoch seconds // step. A 30-day chart is one or two hash reads.
+TIMELINE_LOADED = "timeline:loaded"
+
+
+class Resolution:
+    """Bucket width, buckets per hash, and how long buckets stay readable (None: forever)"""
+    def __init__(self, name: str, step: int, chunk: int, retention: Optional[int]):
+        self.name = name
+        self.step = step
+        self.chunk = chunk
+        self.retention = retention
+        # A chunk has to outlive the retention of its newest bucket
+        self.ttl = retention + step * chunk if retention else None
+
+    def oldest_bucket(self, now: int) -> Optional[int]:
+        return (now - self.retention) // self.step if self.retention else None
+
+
+RESOLUTIONS: Dict[str, Resolution] = {
+    "1m": Resolution("1m", 60, chunk=1440, retention=2 * 86400),
+    "1h": Resolution("1h", 3600, chunk=720, retention=90 * 86400),
+    "1d": Resolution("1d", 86400, chunk=3660, retention=None),
+}
+
+
+def epoch_of(ts: datetime) -> int:
+    """Seconds since the epoch for a naive UTC timestamp"""
+    return int(ts.replace(tzinfo=timezone.utc).timestamp())
+
+
+def timeline_key(poll_id: int, res: Resolution, chunk: int) -> str:
+    return f"timeline:{poll_id}:{res.name}:{chunk}"
+
+
+def queue_timeline_increments(pipe, rows: List[dict]):
+    """Queue the bucket increments for a batch of stored votes, at every resolution"""
+    totals = Counter()
+    for row in rows:
+        t = epoch_of(row["voted_at"])
+        for res in RESOLUTIONS.values():
+            totals[(row["poll_id"], res.name, t // res.step, row["option_id"])] += 1
+    expiring = set()
+    for (poll_id, name, bucket, option_id), n in totals.items():
+        res = RESOLUTIONS[name]
+        key = timeline_key(poll_id, res, bucket // res.chunk)
+        pipe.hincrby(key, f"{bucket}:{option_id}", n)
+        if res.ttl:
+            expiring.add((key, res.ttl))
+    for key, ttl in expiring:
+        pipe.expire(key, ttl)
+
+
+def queue_timeline_read(pipe, poll_id: int, res: Resolution, first: int, last: int):
+    """Queue one HGETALL per chunk covering buckets first..last"""
+    for chunk in range(first // res.chunk, last // res.chunk + 1):
+        pipe.hgetall(timeline_key(poll_id, res, chunk))
+
+
+def timeline_from_replies(replies: Iterable[Dict[str, str]], option_ids: List[int],
+                          first: int, last: int) -> List[List[int]]:
+    """One dense list of counts per option, bucket first..last, zeros where nobody voted"""
+    width = last - first + 1
+    series = {option_id: [0] * width for option_id in option_ids}
+    for raw in replies:
+        for field, value in raw.items():
+            bucket, _, option_id = field.partition(":")
+            column = series.get(int(option_id))
+            offset = int(bucket) - first
+            if column is not None and 0 <= offset < width:
+                column[offset] += int(value)
+    return [series[option_id] for option_id in option_ids]
+
+
+def timeline_snapshot_queries(now: Optional[datetime] = None) -> Dict[str, object]:
+    """
+    (poll_id, option_id, bucket, count) per resolution, for queue_timeline_load().
+    Minutes come from raw votes only; hours and days also count the rollups
+    of retired vote partitions.
+    """
+    now = now or datetime.utcnow()
+    queries = {}
+    for name, res in RESOLUTIONS.items():
+        since = now - timedelta(seconds=res.retention) if res.retention else None
+        raw_bucket = func.floor(func.extract("epoch", Vote.voted_at) / res.step)
+        raw = (
+            select(Vote.poll_id, Vote.option_id, raw_bucket.label("bucket"), func.count(Vote.id).label("n"))
+            .where(Vote.poll_id.is_not(None), Vote.option_id.is_not(None))
+            .group_by(Vote.poll_id, Vote.option_id, raw_bucket)
+        )
+        if since is not None:
+            raw = raw.where(Vote.voted_at >= since)
+        if res.step < 3600:
+            queries[name] = raw
+            continue
+        rolled_bucket = func.floor(func.extract("epoch", VoteRollup.hour) / res.step)
+        rolled = (
+            select(VoteRollup.poll_id, VoteRollup.option_id, rolled_bucket.label("bucket"),
+                   func.sum(VoteRollup.count).label("n"))
+            .group_by(VoteRollup.poll_id, VoteRollup.option_id, rolled_bucket)
+        )
+        if since is not None:
+            rolled = rolled.where(VoteRollup.hour >= since)
+        both = union_all(raw, rolled).subquery()
+        queries[name] = (
+            select(both.c.poll_id, both.c.option_id, both.c.bucket, func.sum(both.c.n))
+            .group_by(both.c.poll_id, both.c.option_id, both.c.bucket)
+        )
+    return queries
+
+
+def queue_timeline_load(pipe, name: str, rows: Iterable[tuple]):
+    """Queue a full overwrite of every chunk the snapshot rows of one resolution touch"""
+    res = RESOLUTIONS[name]
+    chunks: Dict[str, Dict[str, int]] = {}
+    for poll_id, option_id, bucket, n in rows:
+        bucket = int(bucket)
+        chunks.setdefault(timeline_key(poll_id, res, bucket // res.chunk), {})[f"{bucket}:{option_id}"] = int(n)
+    for key, mapping in chunks.items():
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        if res.ttl:
+            pipe.expire(key, res.ttl)
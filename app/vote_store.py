@@ -0,0 +1,186 @@
+# app/vote_store.py
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Integer, and_, cast, delete, func, insert, text, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import select
+
+from models import Option, Vote, VoteRollup, PollOptionLink, PollOptionCount
+from stats_store import queue_vote_stats
+from timeline_store import queue_timeline_increments
+
+# Redis Stream used when votes are ingested asynchronously
+VOTE_STREAM = "votes:stream"
+VOTE_GROUP = "vote-writers"
+# Entries the worker could not store (malformed, or rejected by Postgres),
+# kept with the error for inspection instead of blocking the stream
+VOTE_DEAD_LETTER = "votes:dead"
+DEAD_LETTER_MAXLEN = 100000
+
+# Live results are a Redis hash per poll: option_id -> count, plus a marker
+# field written by the loader so a hash created by a stray HINCRBY on a cold
+# key is never mistaken for a complete one
+RESULTS_LOADED = "loaded"
+
+# Monotonic counters behind the HTTP ETags: one per poll (definition and
+# results), one for the poll list and one bumped by any results change.
+# They carry no TTL so eviction can't reset them; if Redis loses them anyway
+# the epoch disappears with them and every ETag changes.
+VERSION_EPOCH = "version:epoch"
+POLLS_VERSION = "version:polls"
+RESULTS_VERSION = "version:results"
+
+
+def results_key(poll_id: int) -> str:
+    return f"results:{poll_id}"
+
+
+def version_key(poll_id: int) -> str:
+    return f"version:poll:{poll_id}"
+
+
+def encode_vote(poll_id: int, option_id: int, voted_at: Optional[datetime] = None,
+                user_id: Optional[int] = None) -> Dict[str, str]:
+    """Flatten a vote into the string fields stored in the stream entry"""
+    fields = {
+        "poll_id": str(poll_id),
+        "option_id": str(option_id),
+        "voted_at": (voted_at or datetime.utcnow()).isoformat(),
+    }
+    if user_id is not None:
+        fields["user_id"] = str(user_id)
+    return fields
+
+
+def decode_vote(fields: Dict[str, str]) -> dict:
+    """Turn a stream entry back into a row for the vote table"""
+    return {
+        "poll_id": int(fields["poll_id"]),
+        "option_id": int(fields["option_id"]),
+        "user_id": int(fields["user_id"]) if fields.get("user_id") else None,
+        "voted_at": datetime.fromisoformat(fields["voted_at"]),
+    }
+
+
+def vote_insert(rows: List[dict]):
+    """Single multi-row INSERT for a batch of votes"""
+    return insert(Vote).values(rows)
+
+
+def count_upsert(rows: List[dict]):
+    """
+    UPSERT adding a batch of votes to the per-option counters. Run it in the
+    same transaction as vote_insert() so counts and votes never diverge.
+    """
+    totals = Counter((row["poll_id"], row["option_id"]) for row in rows)
+    # Sorted so concurrent batches lock counter rows in the same order
+    values = [
+        {"poll_id": poll_id, "option_id": option_id, "count": n}
+        for (poll_id, option_id), n in sorted(totals.items())
+    ]
+    stmt = pg_insert(PollOptionCount).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["poll_id", "option_id"],
+        set_={"count": PollOptionCount.count + stmt.excluded.count}
+    )
+
+
+def counts_query(poll_ids: Optional[Iterable[int]] = None):
+    """
+    (poll_id, option_id, text, count) for every option of the given polls,
+    or of all polls when poll_ids is None
+    """
+    stmt = (
+        select(
+            PollOptionLink.poll_id,
+            Option.id,
+            Option.text,
+            func.coalesce(PollOptionCount.count, 0).label('vote_count')
+        )
+        .join(PollOptionLink, PollOptionLink.option_id == Option.id)
+        .join(
+            PollOptionCount,
+            and_(
+                PollOptionCount.poll_id == PollOptionLink.poll_id,
+                PollOptionCount.option_id == Option.id
+            ),
+            isouter=True
+        )
+        .order_by(PollOptionLink.poll_id, Option.id)
+    )
+    if poll_ids is not None:
+        stmt = stmt.where(PollOptionLink.poll_id.in_(list(poll_ids)))
+    return stmt
+
+
+def group_counts(rows) -> Dict[int, List[tuple]]:
+    """Split counts_query() rows into poll_id -> [(option_id, text, count)]"""
+    grouped: Dict[int, List[tuple]] = {}
+    for poll_id, option_id, option_text, count in rows:
+        grouped.setdefault(poll_id, []).append((option_id, option_text, count))
+    return grouped
+
+
+def queue_version_bumps(pipe, poll_ids: Iterable[int], polls_changed: bool = False):
+    """Queue the version increments that invalidate ETags for these polls"""
+    for poll_id in set(poll_ids):
+        pipe.incr(version_key(poll_id))
+    pipe.incr(POLLS_VERSION if polls_changed else RESULTS_VERSION)
+
+
+def queue_result_increments(pipe, rows: List[dict]):
+    """
+    Queue one HINCRBY per (poll, option) touched by a batch of votes, plus
+    the ETag version bumps, site-wide counters and timeline buckets that
+    go with them
+    """
+    totals = Counter((row["poll_id"], row["option_id"]) for row in rows)
+    for (poll_id, option_id), n in totals.items():
+        pipe.hincrby(results_key(poll_id), str(option_id), n)
+    queue_version_bumps(pipe, [poll_id for poll_id, _ in totals])
+    queue_vote_stats(pipe, rows)
+    queue_timeline_increments(pipe, rows)
+
+
+def queue_results_load(pipe, poll_id: int, options: List[tuple]):
+    """Queue a full overwrite of a poll's results hash from database counts"""
+    mapping = {str(option_id): count for option_id, _, count in options}
+    mapping[RESULTS_LOADED] = 1
+    pipe.delete(results_key(poll_id))
+    pipe.hset(results_key(poll_id), mapping=mapping)
+
+
+def results_from_hash(raw: Dict[str, str], options) -> Dict[str, int]:
+    """Map a results hash back to {option text: count} in option order"""
+    return {opt.text: int(raw.get(str(opt.id), 0)) for opt in options}
+
+
+def rebuild_counts(session):
+    """
+    Recompute every counter from the raw vote rows plus the rollups of
+    retired partitions. The table lock makes concurrent vote transactions
+    wait, so no increment is lost or doubled.
+    """
+    raw = (
+        select(Vote.poll_id, Vote.option_id, func.count(Vote.id).label("n"))
+        .where(Vote.poll_id.is_not(None), Vote.option_id.is_not(None))
+        .group_by(Vote.poll_id, Vote.option_id)
+    )
+    rolled = (
+        select(VoteRollup.poll_id, VoteRollup.option_id, func.sum(VoteRollup.count).label("n"))
+        .group_by(VoteRollup.poll_id, VoteRollup.option_id)
+    )
+    totals = union_all(raw, rolled).subquery()
+    session.execute(text("LOCK TABLE polloptioncount IN EXCLUSIVE MODE"))
+    session.execute(delete(PollOptionCount))
+    session.execute(
+        insert(PollOptionCount).from_select(
+            ["poll_id", "option_id", "count"],
+            select(totals.c.poll_id, totals.c.option_id, cast(func.sum(totals.c.n), Integer))
+            .group_by(totals.c.poll_id, totals.c.option_id)
+        )
+    )
+    session.commit()
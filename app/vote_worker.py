@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Vote ingestion worker: drains the Redis vote stream in batches and writes
+them to Postgres, acknowledging entries only after the commit succeeds.
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+
+import redis as redis_py
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import Session, create_engine
+
+from vote_store import (
+    VOTE_STREAM, VOTE_GROUP, VOTE_DEAD_LETTER, DEAD_LETTER_MAXLEN, decode_vote,
+    vote_insert, count_upsert, queue_result_increments
+)
+from broadcast import queue_broadcast_notify
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:pass@db:5432/votes")
+REDIS_URL    = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+BATCH_SIZE    = int(os.getenv("VOTE_BATCH_SIZE", "500"))
+BLOCK_MS      = int(os.getenv("VOTE_BLOCK_MS", "200"))
+CLAIM_IDLE_MS = int(os.getenv("VOTE_CLAIM_IDLE_MS", "60000"))
+CONSUMER      = os.getenv("VOTE_CONSUMER", f"{socket.gethostname()}-{os.getpid()}")
+
+engine = create_engine(DATABASE_URL, pool_size=2, max_overflow=0, pool_pre_ping=True)
+redis_client = redis_py.from_url(REDIS_URL, decode_responses=True, socket_timeout=5)
+
+
+def ensure_group():
+    """Create the consumer group (and the stream) if they don't exist yet"""
+    try:
+        redis_client.xgroup_create(VOTE_STREAM, VOTE_GROUP, id="0", mkstream=True)
+        logger.info(f"Created consumer group {VOTE_GROUP} on {VOTE_STREAM}")
+    except redis_py.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_batch(pending_only: bool):
+    """
+    Read up to BATCH_SIZE entries. With pending_only, re-read entries that
+    were delivered to this consumer but never acknowledged.
+    """
+    stream_id = "0" if pending_only else ">"
+    response = redis_client.xreadgroup(
+        VOTE_GROUP, CONSUMER, {VOTE_STREAM: stream_id},
+        count=BATCH_SIZE, block=None if pending_only else BLOCK_MS
+    )
+    if not response:
+        return []
+    return response[0][1]
+
+
+def claim_abandoned():
+    """Take over entries left pending by consumers that died mid-batch"""
+    _, entries, *_ = redis_client.xautoclaim(
+        VOTE_STREAM, VOTE_GROUP, CONSUMER, CLAIM_IDLE_MS, start_id="0-0", count=BATCH_SIZE
+    )
+    if entries:
+        logger.info(f"Claimed {len(entries)} abandoned entries")
+    return entries
+
+
+def write_batch(entries) -> int:
+    """
+    Persist a batch with one multi-row INSERT, then ack and publish. If
+    Postgres rejects the batch, the rows are retried one by one so only the
+    bad ones go to the dead-letter stream.
+    """
+    rows, ids, sources, dead = [], [], [], []
+    for entry_id, fields in entries:
+        ids.append(entry_id)
+        if not fields:
+            # Entry was deleted after delivery; just ack it
+            continue
+        try:
+            rows.append(decode_vote(fields))
+            sources.append((entry_id, fields))
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Dropping malformed vote entry {entry_id}: {e}")
+            dead.append((entry_id, fields, e))
+
+    if not rows:
+        ack(ids, dead)
+        return 0
+
+    with Session(engine) as session:
+        try:
+            session.execute(vote_insert(rows))
+            session.execute(count_upsert(rows))
+            session.commit()
+        except (IntegrityError, DataError) as e:
+            session.rollback()
+            logger.warning(f"Batch of {len(rows)} votes rejected ({e.orig}), retrying row by row")
+            rows, dead = write_rows(session, rows, sources, dead)
+
+        # Ack only once the votes are durable
+        ack(ids, dead)
+
+    if rows:
+        publish_results(rows)
+
+    return len(rows)
+
+
+def write_rows(session, rows, sources, dead):
+    """Insert rows one SAVEPOINT at a time; returns the stored rows and the dead entries"""
+    stored = []
+    for row, (entry_id, fields) in zip(rows, sources):
+        try:
+            with session.begin_nested():
+                session.execute(vote_insert([row]))
+                session.execute(count_upsert([row]))
+            stored.append(row)
+        except (IntegrityError, DataError) as e:
+            logger.warning(f"Dead-lettering vote entry {entry_id}: {e.orig}")
+            dead.append((entry_id, fields, e.orig))
+    session.commit()
+    return stored, dead
+
+
+def ack(ids, dead=()):
+    """
+    Acknowledge and delete processed entries so the stream stays small,
+    moving the ones that could not be stored to the dead-letter stream
+    """
+    if not ids:
+        return
+    pipe = redis_client.pipeline()
+    for entry_id, fields, error in dead:
+        pipe.xadd(VOTE_DEAD_LETTER, {**fields, "entry_id": entry_id, "error": str(error)[:500]},
+                  maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+    pipe.xack(VOTE_STREAM, VOTE_GROUP, *ids)
+    pipe.xdel(VOTE_STREAM, *ids)
+    pipe.execute()
+
+
+def publish_results(rows):
+    """
+    Bump the live counters and ask the API workers for a broadcast of every
+    affected poll; they coalesce it with whatever else is in the window
+    """
+    try:
+        pipe = redis_client.pipeline()
+        queue_result_increments(pipe, rows)
+        queue_broadcast_notify(pipe, [row["poll_id"] for row in rows])
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error publishing results: {e}")
+
+
+def run():
+    ensure_group()
+    logger.info(f"Vote worker {CONSUMER} consuming {VOTE_STREAM} (batch={BATCH_SIZE})")
+
+    # Finish whatever this consumer had in flight before a restart
+    retry_pending = True
+    last_claim = 0.0
+    while True:
+        try:
+            if retry_pending:
+                entries = read_batch(pending_only=True)
+                if entries:
+                    write_batch(entries)
+                    continue
+                retry_pending = False
+
+            if time.time() - last_claim > CLAIM_IDLE_MS / 1000:
+                last_claim = time.time()
+                entries = claim_abandoned()
+                if entries:
+                    write_batch(entries)
+
+            entries = read_batch(pending_only=False)
+            if entries:
+                written = write_batch(entries)
+                logger.debug(f"Wrote {written} votes")
+        except redis_py.ConnectionError as e:
+            logger.error(f"Redis unavailable, retrying: {e}")
+            retry_pending = True
+            time.sleep(1)
+        except Exception as e:
+            # Entries stay pending and are retried from the PEL
+            logger.error(f"Error writing vote batch: {e}")
+            retry_pending = True
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except KeyboardInterrupt:
+        logger.info("Vote worker stopped")
+        sys.exit(0)
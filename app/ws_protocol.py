@@ -0,0 +1,70 @@
+# app/ws_protocol.py
+
+import json
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+
+# What a WebSocket subscriber receives, chosen when it connects:
+#   json  - every broadcast as published, {"poll_id", "seq", "results"} keyed
+#           by option text (default)
+#   delta - one JSON text snapshot with the option texts, then binary frames
+#           carrying only the options whose count changed
+# Clients pick one with the Sec-WebSocket-Protocol header or ?protocol=.
+JSON = "json"
+DELTA = "delta"
+SUBPROTOCOLS = {"votestream.json": JSON, "votestream.delta": DELTA}
+
+# Delta frame, network byte order: poll id and seq as uint32, followed by an
+# (option index uint16, new count uint32) pair per changed option. A frame
+# only applies on top of the previous seq; anything else is sent a snapshot.
+DELTA_HEADER = struct.Struct(">II")
+DELTA_ITEM = struct.Struct(">HI")
+
+
+def negotiate(requested: List[str], query: Optional[str]) -> Tuple[str, Optional[str]]:
+    """(protocol, subprotocol to accept) from the offered subprotocols and ?protocol="""
+    for name in requested:
+        if name in SUBPROTOCOLS:
+            return SUBPROTOCOLS[name], name
+    if query in (JSON, DELTA):
+        return query, None
+    return JSON, None
+
+
+class PollState:
+    """Last broadcast of a poll seen by this worker, in option order"""
+    def __init__(self, seq: int, options: List[str], counts: List[int]):
+        self.seq = seq
+        self.options = options
+        self.counts = counts
+
+    @classmethod
+    def from_message(cls, data: str) -> "PollState":
+        msg = json.loads(data)
+        results: Dict[str, int] = msg["results"]
+        return cls(msg["seq"], list(results), list(results.values()))
+
+
+def snapshot_frame(poll_id: int, state: PollState) -> str:
+    return json.dumps({
+        "type": "snapshot",
+        "poll_id": poll_id,
+        "seq": state.seq,
+        "options": state.options,
+        "counts": state.counts,
+    })
+
+
+def delta_frame(poll_id: int, prev: PollState, state: PollState) -> Optional[bytes]:
+    """Binary frame taking `prev` to `state`, or None when they aren't comparable"""
+    if prev.options != state.options:
+        return None
+    changed = [(i, n) for i, (old, n) in enumerate(zip(prev.counts, state.counts)) if n != old]
+    return DELTA_HEADER.pack(poll_id, state.seq) + b"".join(DELTA_ITEM.pack(i, n) for i, n in changed)
+
+
+def frame_seq(frame: Union[str, bytes]) -> int:
+    """seq carried by any outbound frame: broadcast, snapshot or delta"""
+    if isinstance(frame, bytes):
+        return DELTA_HEADER.unpack_from(frame)[1]
+    return json.loads(frame)["seq"]
@@ -0,0 +1,11 @@
+"""
+Load benchmarks for the VoteStream API.
+
+    python -m bench run --services docker --out bench/baseline.json   # reference commit
+    python -m bench run --services docker --out run.json             # change under test
+    python -m bench compare bench/baseline.json run.json
+
+Baselines depend on the machine, so none is shipped; record one first.
+
+See README.md ("Benchmarks") for starting a throwaway stack to run against.
+"""
@@ -0,0 +1,174 @@
+# bench/__main__.py
+
+import sys
+import json
+import shlex
+import asyncio
+import argparse
+import logging
+import platform
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import httpx
+
+from . import compare as cmp
+from .environment import (
+    COMPOSE_DATABASE_URL, COMPOSE_REDIS_URL, LocalStack, compose, git_commit,
+    start_fake_redis
+)
+from .scenarios import SCENARIOS, load_polls
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("bench")
+# One line per request would drown the summaries
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def run_scenarios(base_url: str, opts) -> dict:
+    limits = httpx.Limits(max_connections=opts.concurrency, max_keepalive_connections=opts.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=opts.timeout) as client:
+        polls = await load_polls(client)
+        logger.info(f"{len(polls)} polls available")
+        results = {}
+        for name in opts.scenarios:
+            logger.info(f"Running {name}")
+            results[name] = await SCENARIOS[name](client, polls, opts)
+            logger.info(f"{name}: {json.dumps(results[name])}")
+        return results
+
+
+def run(opts) -> int:
+    with ExitStack() as stack:
+        base_url = opts.target
+        if base_url is None:
+            database_url, redis_url = opts.database_url, opts.redis_url
+            if opts.services is None and not (database_url and redis_url):
+                # Nothing to run against was given: throwaway docker services
+                opts.services = "docker"
+            if opts.services == "docker":
+                compose("up", "-d", "--wait")
+                if not opts.keep_services:
+                    stack.callback(compose, "down", "-v")
+                database_url = database_url or COMPOSE_DATABASE_URL
+                redis_url = redis_url or COMPOSE_REDIS_URL
+            elif opts.services == "fake-redis":
+                if opts.rate_limits:
+                    logger.error("--rate-limits needs Lua scripts, which fake-redis can't run; use --services docker")
+                    return 2
+                redis_url = start_fake_redis(opts.fake_redis_port)
+            if not database_url or not redis_url:
+                logger.error("fake-redis still needs --database-url")
+                return 2
+            base_url = stack.enter_context(LocalStack(
+                database_url, redis_url, port=opts.port, workers=opts.workers,
+                ingest_mode=opts.ingest_mode, seed=not opts.no_seed,
+                seed_args=shlex.split(opts.seed_args),
+                rate_limits=opts.rate_limits
+            )).base_url
+
+        scenarios = asyncio.run(run_scenarios(base_url.rstrip("/"), opts))
+
+    result = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "target": opts.target or "local",
+            "python": platform.python_version(),
+            "params": {
+                key: getattr(opts, key) for key in (
+                    "scenarios", "concurrency", "duration", "requests", "write_ratio",
+                    "hot_poll", "ws_idle", "ws_active", "ws_votes", "workers",
+                    "ingest_mode", "services", "seed_args"
+                )
+            },
+        },
+        "scenarios": scenarios,
+    }
+    body = json.dumps(result, indent=2)
+    if opts.out:
+        with open(opts.out, "w") as f:
+            f.write(body + "\n")
+        logger.info(f"Results written to {opts.out}")
+    else:
+        print(body)
+
+    if opts.baseline:
+        return report(cmp.load(opts.baseline), result, opts)
+    return 0
+
+
+def report(baseline: dict, current: dict, opts) -> int:
+    params = (baseline.get("meta", {}).get("params"), current.get("meta", {}).get("params"))
+    services = [(p or {}).get("services") for p in params]
+    if "fake-redis" in services and services[0] != services[1]:
+        logger.error("Only one of the runs used fake-redis, whose numbers aren't comparable with real Redis")
+        return 2
+    if params[0] != params[1]:
+        logger.warning("Baseline was recorded with different parameters; comparison may be meaningless")
+    rows = cmp.compare(baseline, current, opts.threshold, opts.min_delta_ms)
+    print(cmp.report(rows))
+    regressed = [r["metric"] for r in rows if r["verdict"] == "regressed"]
+    if regressed:
+        logger.error(f"{len(regressed)} metric(s) regressed beyond {opts.threshold:.0%}")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="VoteStream load benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    r = sub.add_parser("run", help="run scenarios and write JSON results")
+    r.add_argument("--target", help="base URL of a running deployment (skips starting anything)")
+    r.add_argument("--services", choices=["docker", "fake-redis"],
+                   help="start Postgres and Redis from bench/docker-compose.yml (the default without "
+                        "--target or both URLs), or an in-process Redis stand-in without Lua")
+    r.add_argument("--keep-services", action="store_true", help="leave the docker services running afterwards")
+    r.add_argument("--database-url", help="Postgres for a locally started API")
+    r.add_argument("--redis-url", help="Redis for a locally started API")
+    r.add_argument("--fake-redis-port", type=int, default=56380)
+    r.add_argument("--port", type=int, default=8800, help="port for a locally started API")
+    r.add_argument("--workers", type=int, default=4, help="uvicorn workers for a locally started API")
+    r.add_argument("--ingest-mode", choices=["sync", "stream"], default="sync")
+    r.add_argument("--no-seed", action="store_true", help="don't reseed the database before starting")
+    r.add_argument("--seed-args", default="",
+                   help='extra seed_polls.py arguments, e.g. "--scale --votes 50000000"')
+    r.add_argument("--rate-limits", action="store_true", help="keep rate limiting on in a locally started API")
+
+    r.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    r.add_argument("--concurrency", type=int, default=50, help="concurrent HTTP clients")
+    r.add_argument("--duration", type=float, default=20, help="seconds per HTTP scenario")
+    r.add_argument("--requests", type=int, default=0, help="stop an HTTP scenario after this many requests")
+    r.add_argument("--timeout", type=float, default=10, help="HTTP request timeout")
+    r.add_argument("--write-ratio", type=float, default=0.02, help="share of votes mixed into read_heavy")
+    r.add_argument("--hot-poll", type=int, help="poll id for vote_storm and websockets (default: first poll)")
+    r.add_argument("--ws-url", help="WebSocket base URL, if it differs from the HTTP target")
+    r.add_argument("--ws-protocol", choices=["json", "delta"], default="json",
+                   help="update protocol the subscribers negotiate")
+    r.add_argument("--ws-idle", type=int, default=5000, help="idle WebSocket subscribers")
+    r.add_argument("--ws-active", type=int, default=100, help="subscribers on the hot poll")
+    r.add_argument("--ws-votes", type=int, default=200, help="votes whose delivery is timed")
+    r.add_argument("--ws-timeout", type=float, default=5, help="connect and delivery timeout")
+    r.add_argument("--ws-connect-concurrency", type=int, default=200)
+
+    r.add_argument("--out", help="write results here instead of stdout")
+    r.add_argument("--baseline", help="compare against this result file; exit 1 on regression")
+    r.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    r.add_argument("--min-delta-ms", type=float, default=1.0,
+                   help="ignore latency changes smaller than this, however large relatively")
+
+    c = sub.add_parser("compare", help="diff two result files; exit 1 on regression")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--threshold", type=float, default=0.10)
+    c.add_argument("--min-delta-ms", type=float, default=1.0)
+
+    opts = parser.parse_args(argv)
+    if opts.command == "compare":
+        return report(cmp.load(opts.baseline), cmp.load(opts.current), opts)
+    return run(opts)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
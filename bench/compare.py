@@ -0,0 +1,88 @@
+# bench/compare.py
+
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Which way is better for each compared metric (by the last path segment);
+# anything else in a result file is informational and never compared
+LOWER_IS_BETTER = {"p50", "p95", "p99", "error_rate", "deliveries_lost", "failed", "frame_bytes"}
+HIGHER_IS_BETTER = {"throughput_rps"}
+LATENCY_GROUPS = {"latency_ms", "delivery_ms", "connect_ms"}
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def flatten(tree: dict, prefix: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], float]]:
+    for key, value in tree.items():
+        path = prefix + (key,)
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compared(path: Tuple[str, ...]) -> bool:
+    name = path[-1]
+    if name in {"p50", "p95", "p99"}:
+        return len(path) > 1 and path[-2] in LATENCY_GROUPS
+    return name in LOWER_IS_BETTER or name in HIGHER_IS_BETTER
+
+
+def verdict(path: Tuple[str, ...], base: float, current: float,
+            threshold: float, min_delta_ms: float) -> Optional[str]:
+    """'regressed', 'improved' or None when the change is within tolerance"""
+    name = path[-1]
+    delta = current - base
+    if name in {"error_rate", "deliveries_lost", "failed"}:
+        # Counts of things going wrong: any increase matters, ratios get a
+        # small allowance for noise
+        allowance = 0.005 if name == "error_rate" else 0
+        if delta > allowance:
+            return "regressed"
+        return "improved" if delta < -allowance else None
+    if name in {"p50", "p95", "p99"} and abs(delta) < min_delta_ms:
+        return None
+    if base == 0:
+        return None
+    change = delta / base
+    if name in HIGHER_IS_BETTER:
+        change = -change
+    if change > threshold:
+        return "regressed"
+    if change < -threshold:
+        return "improved"
+    return None
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10,
+            min_delta_ms: float = 1.0) -> List[dict]:
+    """One row per metric present in both files' scenarios"""
+    base_metrics: Dict[Tuple[str, ...], float] = dict(flatten(baseline.get("scenarios", {})))
+    rows = []
+    for path, value in flatten(current.get("scenarios", {})):
+        if not compared(path) or path not in base_metrics:
+            continue
+        base = base_metrics[path]
+        rows.append({
+            "metric": ".".join(path),
+            "baseline": base,
+            "current": value,
+            "change": round((value - base) / base, 4) if base else None,
+            "verdict": verdict(path, base, value, threshold, min_delta_ms),
+        })
+    return rows
+
+
+def report(rows: List[dict]) -> str:
+    width = max((len(r["metric"]) for r in rows), default=10)
+    lines = [f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}"]
+    for r in rows:
+        change = f"{r['change']:+.1%}" if r["change"] is not None else "n/a"
+        flag = {"regressed": "  REGRESSED", "improved": "  improved"}.get(r["verdict"], "")
+        lines.append(
+            f"{r['metric']:<{width}}  {r['baseline']:>12g}  {r['current']:>12g}  {change:>8}{flag}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,272 @@
+# bench/scenarios.py
+
+import json
+import random
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import websockets
+
+from .stats import Recorder, latency_summary
+
+logger = logging.getLogger(__name__)
+
+
+class Poll:
+    def __init__(self, id: int, options: int):
+        self.id = id
+        self.options = options
+
+
+async def load_polls(client: httpx.AsyncClient) -> List[Poll]:
+    """Every poll with options, in one NDJSON export"""
+    response = await client.get("/polls", params={"format": "ndjson"})
+    response.raise_for_status()
+    polls = []
+    for line in response.text.splitlines():
+        if line:
+            poll = json.loads(line)
+            if poll["options"]:
+                polls.append(Poll(poll["id"], len(poll["options"])))
+    if not polls:
+        raise RuntimeError("No polls to benchmark against; seed the database first")
+    return polls
+
+
+def hot_poll(polls: List[Poll], opts) -> Poll:
+    if opts.hot_poll is None:
+        return polls[0]
+    for poll in polls:
+        if poll.id == opts.hot_poll:
+            return poll
+    raise RuntimeError(f"Poll {opts.hot_poll} not found")
+
+
+async def closed_loop(send: Callable[[int], Awaitable[int]], opts) -> Recorder:
+    """
+    `opts.concurrency` clients each send their next request as soon as the
+    previous one returns, until `opts.duration` seconds or `opts.requests`
+    requests in total, whichever comes first. `send` gets the client number
+    and returns the response status.
+    """
+    rec = Recorder()
+    deadline = time.perf_counter() + opts.duration
+    issued = 0
+
+    async def client_loop(me: int):
+        nonlocal issued
+        while time.perf_counter() < deadline and (not opts.requests or issued < opts.requests):
+            issued += 1
+            start = time.perf_counter()
+            try:
+                status = await send(me)
+            except Exception as e:
+                rec.error(e)
+                continue
+            rec.record(status, time.perf_counter() - start)
+
+    rec.begin()
+    await asyncio.gather(*(client_loop(me) for me in range(opts.concurrency)))
+    rec.end()
+    return rec
+
+
+async def post_vote(client: httpx.AsyncClient, poll: Poll) -> int:
+    response = await client.post(
+        f"/polls/{poll.id}/vote", json={"choice": random.randrange(poll.options)}
+    )
+    return response.status_code
+
+
+async def vote_storm(client: httpx.AsyncClient, polls: List[Poll], opts) -> dict:
+    """Every client votes on the same poll: one results hash, one pub/sub channel"""
+    poll = hot_poll(polls, opts)
+    rec = await closed_loop(lambda me: post_vote(client, poll), opts)
+    return dict(rec.summary(), poll_id=poll.id)
+
+
+async def vote_spread(client: httpx.AsyncClient, polls: List[Poll], opts) -> dict:
+    """Votes on a uniformly random poll each time"""
+    rec = await closed_loop(lambda me: post_vote(client, random.choice(polls)), opts)
+    return dict(rec.summary(), polls=len(polls))
+
+
+async def read_heavy(client: httpx.AsyncClient, polls: List[Poll], opts) -> dict:
+    """
+    /polls-with-results from many clients, with a trickle of votes so the
+    cached listing keeps being invalidated. Each client keeps its own ETag,
+    like a browser tab would.
+    """
+    etags: Dict[int, str] = {}
+
+    async def send(me: int) -> int:
+        if opts.write_ratio and random.random() < opts.write_ratio:
+            return await post_vote(client, random.choice(polls))
+        headers = {"If-None-Match": etags[me]} if me in etags else None
+        response = await client.get("/polls-with-results", headers=headers)
+        if "etag" in response.headers:
+            etags[me] = response.headers["etag"]
+        return response.status_code
+
+    rec = await closed_loop(send, opts)
+    return rec.summary()
+
+
+class Subscriber:
+    """One WebSocket client; records the arrival time and size of every message"""
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.arrivals: asyncio.Queue = asyncio.Queue()
+        self.frames = 0
+        self.frame_bytes = 0
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self, timeout: float):
+        # Pings from thousands of sockets only add noise to the numbers
+        self.ws = await websockets.connect(
+            self.url, open_timeout=timeout, ping_interval=None, max_queue=None
+        )
+
+    def listen(self):
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                self.arrivals.put_nowait(time.perf_counter())
+                self.frames += 1
+                self.frame_bytes += len(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    def drain(self):
+        while not self.arrivals.empty():
+            self.arrivals.get_nowait()
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+
+def raise_fd_limit(wanted: int):
+    """Thousands of sockets need more than the usual 1024 descriptors"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        if target < wanted:
+            logger.warning(f"Open file limit is {target}; some WebSockets may fail to connect")
+
+
+async def websockets_fanout(client: httpx.AsyncClient, polls: List[Poll], opts) -> dict:
+    """
+    `opts.ws_idle` subscribers spread over the other polls, plus
+    `opts.ws_active` on the hot poll. Votes on the hot poll are then sent one
+    at a time, and each one waits until every active subscriber has been
+    notified, so delivery latency (vote sent -> message received) is measured
+    per message rather than smeared across a backlog.
+    """
+    poll = hot_poll(polls, opts)
+    others = [p for p in polls if p.id != poll.id] or [poll]
+    ws_base = opts.ws_url or str(client.base_url).replace("http", "ws", 1).rstrip("/")
+    raise_fd_limit(opts.ws_idle + opts.ws_active + opts.concurrency + 256)
+
+    connect_times: List[float] = []
+    connect_errors: Dict[str, int] = {}
+    gate = asyncio.Semaphore(opts.ws_connect_concurrency)
+
+    async def open_subscriber(poll_id: int) -> Optional[Subscriber]:
+        sub = Subscriber(f"{ws_base}/polls/{poll_id}/stream?protocol={opts.ws_protocol}")
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await sub.connect(opts.ws_timeout)
+            except Exception as e:
+                name = type(e).__name__
+                connect_errors[name] = connect_errors.get(name, 0) + 1
+                return None
+            connect_times.append(time.perf_counter() - start)
+        return sub
+
+    idle = await asyncio.gather(*(
+        open_subscriber(others[i % len(others)].id) for i in range(opts.ws_idle)
+    ))
+    active = await asyncio.gather(*(open_subscriber(poll.id) for _ in range(opts.ws_active)))
+    idle = [s for s in idle if s is not None]
+    active = [s for s in active if s is not None]
+    for sub in idle + active:
+        sub.listen()
+    logger.info(f"{len(idle)} idle and {len(active)} active subscribers connected")
+
+    rec = Recorder()
+    delivery: List[float] = []
+    lost = 0
+    try:
+        # Let the hub finish subscribing before the first vote
+        await asyncio.sleep(0.5)
+        for sub in active:
+            # Delta subscribers start with a snapshot; only count updates
+            sub.frames = sub.frame_bytes = 0
+        rec.begin()
+        for _ in range(opts.ws_votes):
+            for sub in active:
+                sub.drain()
+            sent = time.perf_counter()
+            try:
+                status = await post_vote(client, poll)
+            except Exception as e:
+                rec.error(e)
+                continue
+            rec.record(status, time.perf_counter() - sent)
+            if status >= 300:
+                continue
+
+            async def arrival(sub: Subscriber) -> Optional[float]:
+                try:
+                    return await asyncio.wait_for(sub.arrivals.get(), opts.ws_timeout)
+                except asyncio.TimeoutError:
+                    return None
+
+            for arrived in await asyncio.gather(*(arrival(sub) for sub in active)):
+                if arrived is None:
+                    lost += 1
+                else:
+                    delivery.append(arrived - sent)
+        rec.end()
+    finally:
+        await asyncio.gather(*(sub.close() for sub in idle + active), return_exceptions=True)
+
+    frames = sum(sub.frames for sub in active)
+    return {
+        "protocol": opts.ws_protocol,
+        "subscribers": {
+            "idle": len(idle),
+            "active": len(active),
+            "failed": sum(connect_errors.values()),
+            "errors": connect_errors,
+        },
+        "connect_ms": latency_summary(connect_times),
+        "votes": rec.summary(),
+        "delivery_ms": latency_summary(delivery),
+        "deliveries_lost": lost,
+        # Payload size before permessage-deflate
+        "frame_bytes": round(sum(sub.frame_bytes for sub in active) / frames, 1) if frames else 0.0,
+    }
+
+
+SCENARIOS = {
+    "vote_storm": vote_storm,
+    "vote_spread": vote_spread,
+    "read_heavy": read_heavy,
+    "websockets": websockets_fanout,
+}
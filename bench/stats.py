@@ -0,0 +1,76 @@
+# bench/stats.py
+
+import math
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """q-th percentile (0-100) of an already sorted list, linear interpolation"""
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """count, mean and p50/p95/p99/max of latencies given in seconds, reported in ms"""
+    ordered = sorted(seconds)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(ordered),
+        "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50": ms(percentile(ordered, 50)),
+        "p95": ms(percentile(ordered, 95)),
+        "p99": ms(percentile(ordered, 99)),
+        "max": ms(ordered[-1]) if ordered else 0.0,
+    }
+
+
+class Recorder:
+    """Per-request latencies and outcomes of one scenario"""
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def begin(self):
+        self.started = time.perf_counter()
+
+    def end(self):
+        self.finished = time.perf_counter()
+
+    def record(self, status: int, latency: float):
+        self.statuses[status] += 1
+        # Only successful requests count towards latency and throughput;
+        # a fast 429 would otherwise flatter the numbers
+        if 200 <= status < 400:
+            self.latencies.append(latency)
+
+    def error(self, exc: BaseException):
+        self.errors[type(exc).__name__] += 1
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self) -> dict:
+        requests = sum(self.statuses.values()) + sum(self.errors.values())
+        ok = len(self.latencies)
+        elapsed = self.elapsed
+        return {
+            "requests": requests,
+            "ok": ok,
+            "error_rate": round(1 - ok / requests, 4) if requests else 0.0,
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": latency_summary(self.latencies),
+            "statuses": {str(code): n for code, n in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+        }
@@ -1,12 +1,24 @@
 const $ = sel => document.querySelector(sel);
+// Last ETag and body per GET url, so unchanged data costs a 304 and no JSON
+const etagCache = new Map();
 const api = async (url, m = "GET", body) => {
     try {
+        const headers = { 'Content-Type': 'application/json' };
+        const cached = m === "GET" ? etagCache.get(url) : undefined;
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+        
         const response = await fetch(url, {
             method: m,
-            headers: { 'Content-Type': 'application/json' },
+            headers,
             body: body && JSON.stringify(body)
         });
         
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+        
         if (response.status === 429) {
             throw new Error('Rate limit exceeded');
         }
@@ -15,7 +27,12 @@ const api = async (url, m = "GET", body) => {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        return await response.json();
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (m === "GET" && etag) {
+            etagCache.set(url, { etag, data });
+        }
+        return data;
     } catch (error) {
         console.error('API Error:', error);
         throw error;
@@ -27,7 +44,105 @@ let currentWebSocket = null;
 let votingInProgress = false;
 let pollCache = new Map();
 let lastVoteTime = 0;
-let pollingInterval = null;
+let longPoll = null;
+
+// One WebSocket (/stream) shared by every live view; each view follows the
+// polls it shows and gets their results pushed instead of polling for them
+const live = {
+    subscription: null,   // {polls: [...]} or {theme: key} of the current view
+    onResults: null,      // (pollId, results) => void for the current view
+    lastSeq: new Map(),   // poll id -> seq of the newest results seen
+    retryDelay: 1000,
+    failures: 0,          // WebSockets in a row that never opened
+    fallback: false,      // WebSockets don't get through; use SSE or long-polling
+    source: null          // EventSource of the fallback
+};
+
+// Broadcasts can overtake each other; only move forward
+function liveDeliver(msg) {
+    if (!live.onResults || msg.seq < (live.lastSeq.get(msg.poll_id) || 0)) return;
+    live.lastSeq.set(msg.poll_id, msg.seq);
+    live.onResults(msg.poll_id, msg.results);
+}
+
+function liveConnect() {
+    if (live.fallback || !window.WebSocket) return liveFallback();
+    const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${scheme}://${location.host}/stream`);
+    let opened = false;
+    currentWebSocket = ws;
+    ws.onopen = () => {
+        opened = true;
+        live.failures = 0;
+        live.retryDelay = 1000;
+        if (live.subscription) {
+            ws.send(JSON.stringify({action: 'subscribe', ...live.subscription}));
+        }
+    };
+    ws.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (!msg.type) liveDeliver(msg);  // skip subscribe acks and errors
+    };
+    ws.onclose = () => {
+        if (currentWebSocket !== ws) return;
+        currentWebSocket = null;
+        // A proxy stripping the upgrade fails every attempt; stop trying
+        if (!opened && ++live.failures >= 2) {
+            live.fallback = true;
+            return liveFallback();
+        }
+        // Reconnect while a view still wants updates
+        if (live.subscription) {
+            setTimeout(() => { if (live.subscription && !currentWebSocket) liveConnect(); }, live.retryDelay);
+            live.retryDelay = Math.min(live.retryDelay * 2, 30000);
+        }
+    };
+}
+
+// Without WebSockets a single poll's results come from /polls/{id}/events,
+// or from long-polling /polls/{id}/results?since= where EventSource is
+// missing; either returns as soon as they change. Theme pages keep the
+// counts they loaded with.
+function liveFallback() {
+    liveFallbackStop();
+    const polls = live.subscription && live.subscription.polls;
+    if (!polls || polls.length !== 1) return;
+    if (!window.EventSource) return startPollingResults(polls[0]);
+    const source = new EventSource(`/polls/${polls[0]}/events`);
+    source.addEventListener('results', (event) => liveDeliver(JSON.parse(event.data)));
+    live.source = source;
+}
+
+function liveFallbackStop() {
+    if (live.source) {
+        live.source.close();
+        live.source = null;
+    }
+    stopPolling();
+}
+
+function liveFollow(subscription, onResults) {
+    const ws = currentWebSocket;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({action: 'unsubscribe'}));
+        ws.send(JSON.stringify({action: 'subscribe', ...subscription}));
+    }
+    live.subscription = subscription;
+    live.onResults = onResults;
+    live.lastSeq.clear();
+    if (live.fallback) liveFallback();
+    else if (!ws) liveConnect();
+}
+
+function liveStop() {
+    const ws = currentWebSocket;
+    if (ws && ws.readyState === WebSocket.OPEN && live.subscription) {
+        ws.send(JSON.stringify({action: 'unsubscribe'}));
+    }
+    live.subscription = null;
+    live.onResults = null;
+    liveFallbackStop();
+}
 
 // Mock data organized by themes
 const mockThemes = {
@@ -86,6 +201,7 @@ async function loadThemes() {
 // Function to render themes view
 function renderThemes(themes) {
     currentView = 'themes';
+    liveStop();
     const container = document.getElementById('main-content');
     
     container.innerHTML = `
@@ -125,6 +241,13 @@ async function loadThemePolls(themeKey) {
         const theme = themes[themeKey] || mockThemes[themeKey];
         
         renderThemePolls(theme, polls);
+        liveFollow({theme: themeKey}, (pollId, results) => {
+            const elem = document.getElementById(`poll-votes-${pollId}`);
+            if (elem) {
+                const total = Object.values(results).reduce((sum, count) => sum + count, 0);
+                elem.textContent = `${total} votes`;
+            }
+        });
     } catch (error) {
         console.log('Backend not available, using mock polls');
         const theme = mockThemes[themeKey];
@@ -155,6 +278,7 @@ function renderThemePolls(theme, polls) {
                     <div class="poll-options-preview">
                         ${poll.options.map(opt => `<span class="option-chip">${opt.text}</span>`).join('')}
                     </div>
+                    <div class="poll-live-count" id="poll-votes-${poll.id}"></div>
                     <button class="vote-btn-modern">
                         <span>Vote now</span>
                         <div class="btn-particles"></div>
@@ -188,33 +312,35 @@ function updateOptionFields() {
     }
 }
 
-function startPollingResults(pollId) {
-    if (pollingInterval) clearInterval(pollingInterval);
-    
-    pollingInterval = setInterval(async () => {
+// Long-poll: each request is answered as soon as the results move past
+// `since` (200) or after the server's timeout with nothing new (204)
+async function startPollingResults(pollId) {
+    stopPolling();
+    const controller = new AbortController();
+    longPoll = controller;
+    while (longPoll === controller) {
+        const since = live.lastSeq.get(pollId) || 0;
         try {
-            const results = await api(`/polls/${pollId}/results`);
-            const resultsElem = $('#results');
-            if (resultsElem) {
-                resultsElem.textContent = JSON.stringify(results, null, 2);
-                resultsElem.classList.add('results-updated');
-                setTimeout(() => resultsElem.classList.remove('results-updated'), 300);
+            const response = await fetch(`/polls/${pollId}/results?since=${since}`, {signal: controller.signal});
+            if (response.status === 200) {
+                liveDeliver(await response.json());
+                continue;
             }
+            if (response.status === 204) continue;
+            // Rate limited or failing: back off before asking again
+            console.log(`Long-poll got ${response.status}, retrying in 10s`);
         } catch (error) {
-            // If rate limited, just skip this poll and try again later
-            if (error.message && error.message.includes('Rate limit')) {
-                console.log('Rate limited, skipping poll cycle');
-                return;
-            }
+            if (controller.signal.aborted) return;
             console.error('Error polling results:', error);
         }
-    }, 10000); // Increased from 3000ms to 10000ms (10 seconds)
+        await new Promise(resolve => setTimeout(resolve, 10000));
+    }
 }
 
 function stopPolling() {
-    if (pollingInterval) {
-        clearInterval(pollingInterval);
-        pollingInterval = null;
+    if (longPoll) {
+        longPoll.abort();
+        longPoll = null;
     }
 }
 
@@ -303,11 +429,12 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function closeCurrentWebSocket() {
+    live.subscription = null;
     if (currentWebSocket) {
         currentWebSocket.close();
         currentWebSocket = null;
     }
-    stopPolling();
+    liveFallbackStop();
 }
 
 const mockResults = {
@@ -447,6 +574,9 @@ async function showVotingInterface(pollId) {
     
     setupVoteOptionListeners(poll);
     loadVoteResults(pollId);
+    liveFollow({polls: [poll.id]}, (id, results) => {
+        if (currentView === 'vote' && id === poll.id) displayResults(results);
+    });
 }
 
 function setupVoteOptionListeners(poll) {